@@ -1,16 +1,121 @@
 # api/app.py
-import sys, os
-from fastapi import FastAPI, Form
+import sys, os, re, json, time, uuid, asyncio, secrets, logging, threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Dict
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config import API_HOST, API_PORT
-from rag.rag_chain import load_vectorstore, create_rag_chain, get_answer
+from config import PROJECT_ROOT, API_HOST, API_PORT, API_WORKERS, EMBEDDING_SERVER_SOCKET, SESSION_BACKEND, INDEX_RELOAD_INTERVAL, METRICS_ENABLED, TRACE_HEADERS, ANSWER_CACHE_ENABLED
+from rag.rag_chain import load_embeddings_model, load_vectorstore, create_rag_chain, aget_answer, astream_answer
+from embeddings.index_snapshots import current_snapshot, snapshot_size
+from rag.memory_buffer import store as session_store
+from rag.metrics import Gauge, REQUEST_SECONDS, REQUESTS, register_gauge, register_cache, render_metrics, start_trace, server_timing
+from rag.answer_cache import AnswerCache
 
-app = FastAPI(title="Conversational RAG API")
-vectorstore = load_vectorstore()
-rag_chain = create_rag_chain(vectorstore)
+logger = logging.getLogger("uvicorn.error")
+
+class ServingState:
+    def __init__(self):
+        self.live = None # (rag_chain, index version), replaced as one reference on reload
+        self.vectorstore = None
+        self.embeddings_model = None
+        self.answer_cache = None
+        self.phases = {} # startup phase -> seconds
+        self.error = None
+        self.ready = threading.Event()
+        self.reload_lock = threading.Lock()
+        self.loaded_at = None
+        self.reloads = 0
+        self.reload_error = None
+
+state = ServingState()
+
+def start_up():
+    # Runs in the background so uvicorn accepts connections (and /healthz answers) immediately
+    def phase(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        state.phases[name] = round(time.perf_counter() - start, 3)
+        logger.info("Startup phase '%s' took %.3fs", name, state.phases[name])
+        return result
+    try:
+        state.embeddings_model = phase("embedding_model", lambda: load_embeddings_model(warm_up=True))
+        state.vectorstore = phase("index", lambda: load_vectorstore(state.embeddings_model))
+        state.live = (phase("rag_chain", lambda: create_rag_chain(state.vectorstore)), state.vectorstore.index_version)
+        if ANSWER_CACHE_ENABLED:
+            state.answer_cache = AnswerCache(state.embeddings_model, state.vectorstore.index_version)
+            register_cache("answer", state.answer_cache)
+        state.loaded_at = time.time()
+        state.ready.set()
+        logger.info("Ready after %.3fs on index %s", sum(state.phases.values()), state.vectorstore.index_version)
+    except Exception as e:
+        state.error = f"{type(e).__name__}: {e}"
+        logger.exception("Startup failed")
+        return
+    while INDEX_RELOAD_INTERVAL > 0:
+        time.sleep(INDEX_RELOAD_INTERVAL)
+        reload_index()
+
+def reload_index():
+    """Loads a newly published snapshot next to the live one and swaps it in; requests already running keep the old chain."""
+    with state.reload_lock:
+        version, _ = current_snapshot()
+        if version is None or version == state.vectorstore.index_version: return False
+        try:
+            start = time.perf_counter()
+            vectorstore = load_vectorstore(state.embeddings_model)
+            rag_chain = create_rag_chain(vectorstore)
+        except Exception as e:
+            state.reload_error = f"{type(e).__name__}: {e}"
+            logger.exception("Loading index snapshot %s failed; still serving %s", version, state.vectorstore.index_version)
+            return False
+        # Each request reads state.live once, so swapping the reference is enough to switch versions;
+        # requests still on the old version bypass the answer cache from here on
+        state.vectorstore, state.live = vectorstore, (rag_chain, vectorstore.index_version)
+        if state.answer_cache is not None: state.answer_cache.reset(vectorstore.index_version)
+        state.loaded_at, state.reload_error = time.time(), None
+        state.reloads += 1
+        logger.info("Switched to index snapshot %s in %.3fs", version, time.perf_counter() - start)
+        return True
+
+@asynccontextmanager
+async def lifespan(app):
+    threading.Thread(target=start_up, name="startup", daemon=True).start()
+    yield
+
+app = FastAPI(title="Conversational RAG API", lifespan=lifespan)
+
+TRACED_PATHS = {"/chat", "/chat/stream"}
+register_gauge(Gauge("rag_active_sessions", "Chat sessions held by this worker (all workers for the sqlite backend).", collect=lambda: {(): len(session_store)}))
+register_gauge(Gauge("rag_index_vectors", "Vectors in the live FAISS index.", ("version",), lambda: {(state.vectorstore.index_version,): state.vectorstore.index.ntotal} if state.vectorstore else {}))
+register_gauge(Gauge("rag_query_embedding_batches", "Query embedding batches and the queries they held.", ("kind",),
+                     lambda: {("batches",): state.embeddings_model.batches, ("queries",): state.embeddings_model.queries} if hasattr(state.embeddings_model, "batches") else {}))
+register_gauge(Gauge("rag_answer_cache_saved_seconds", "Estimated answer time saved by answer cache hits.", collect=lambda: {(): round(state.answer_cache.saved_seconds, 3)} if state.answer_cache else {}))
+register_gauge(Gauge("rag_answer_cache_entries", "Answers held by the answer cache.", collect=lambda: {(): len(state.answer_cache)} if state.answer_cache else {}))
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if not METRICS_ENABLED or request.url.path not in TRACED_PATHS: return await call_next(request)
+    # A caller-supplied id ties our stage timings to its own logs
+    trace_id = request.headers.get("x-trace-id", "")
+    trace = start_trace(trace_id if re.fullmatch(r"[\w.-]{1,64}", trace_id) else uuid.uuid4().hex)
+    start = time.perf_counter()
+    response = await call_next(request)
+    if TRACE_HEADERS:
+        response.headers["X-Trace-Id"] = trace["id"]
+        # Streaming responses send headers before any stage has run
+        if trace["stages"]: response.headers["Server-Timing"] = server_timing(trace)
+    body = response.body_iterator
+    async def observed_body():
+        try:
+            async for chunk in body: yield chunk
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, request.url.path)
+            REQUESTS.inc(request.url.path, response.status_code)
+    response.body_iterator = observed_body()
+    return response
 
 class Source(BaseModel):
     content: str
@@ -20,12 +125,90 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[Source]
 
+def serialize_sources(documents):
+    return [{"content": doc.page_content, "metadata": doc.metadata} for doc in documents]
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def ready_chain():
+    if not state.ready.is_set():
+        raise HTTPException(status_code=503, detail=state.error or "The chatbot is still starting up.", headers={"Retry-After": "5"})
+    return state.live
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/readyz")
+async def readyz():
+    if state.ready.is_set():
+        return {"status": "ready", "startup_phases": state.phases}
+    return JSONResponse(status_code=503, content={"status": "failed" if state.error else "starting", "error": state.error, "startup_phases": state.phases})
+
+def index_status():
+    vectorstore = state.vectorstore
+    return {"version": vectorstore.index_version, "vectors": vectorstore.index.ntotal, "documents": len(vectorstore.docstore),
+            "size_bytes": snapshot_size(vectorstore.index_folder), "loaded_at": state.loaded_at, "reloads": state.reloads,
+            "published_version": current_snapshot()[0], "reload_error": state.reload_error}
+
+@app.get("/admin/index")
+async def admin_index():
+    ready_chain()
+    return index_status()
+
+@app.post("/admin/index/reload")
+async def admin_index_reload():
+    # Runs off the event loop: loading a snapshot reads from disk
+    ready_chain()
+    reloaded = await asyncio.to_thread(reload_index)
+    return {"reloaded": reloaded, **index_status()}
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(query: str = Form(...), session_id: str = Form("default_session")):
-    response = get_answer(query, session_id, rag_chain)
-    source_documents = [{"content": doc.page_content, "metadata": doc.metadata} for doc in response.get("context", [])]
-    return {"answer": response["answer"], "sources": source_documents}
+    rag_chain, version = ready_chain()
+    response = await aget_answer(query, session_id, rag_chain, state.answer_cache, version)
+    return {"answer": response["answer"], "sources": serialize_sources(response.get("context", []))}
+
+@app.post("/chat/stream")
+async def chat_stream(query: str = Form(...), session_id: str = Form("default_session")):
+    rag_chain, version = ready_chain()
+    # Server-sent events: one "sources" event, then "token" events as the answer is generated, then "done"
+    async def events():
+        try:
+            async for kind, payload in astream_answer(query, session_id, rag_chain, state.answer_cache, version):
+                yield sse_event(kind, serialize_sources(payload) if kind == "sources" else payload)
+            yield sse_event("done", {})
+        except Exception as e:
+            yield sse_event("error", str(e))
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def serve_workers(workers):
+    """Runs several uvicorn workers that share one embedding server; the index and docstore are mmap'd, so their pages are shared too."""
+    import uvicorn, multiprocessing
+    from rag.embedding_server import serve
+    if SESSION_BACKEND == "memory":
+        logger.warning("SESSION_BACKEND is 'memory': each worker keeps its own chat histories. Use 'sqlite' to share them.")
+    # Workers are spawned after these are set, so their config picks up the shared server
+    authkey = secrets.token_hex(16)
+    os.environ.update(EMBEDDING_SERVER="1", EMBEDDING_SERVER_SOCKET=EMBEDDING_SERVER_SOCKET, EMBEDDING_SERVER_AUTHKEY=authkey)
+    server = multiprocessing.get_context("spawn").Process(target=serve, args=(EMBEDDING_SERVER_SOCKET, authkey), name="embedding-server", daemon=True)
+    server.start()
+    try:
+        uvicorn.run("api.app:app", host=API_HOST, port=API_PORT, workers=workers, app_dir=PROJECT_ROOT)
+    finally:
+        server.terminate()
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host=API_HOST, port=API_PORT)
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the chatbot API.")
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="uvicorn worker processes sharing one embedding server.")
+    args = parser.parse_args()
+    if args.workers > 1: serve_workers(args.workers)
+    else:
+        import uvicorn
+        uvicorn.run(app, host=API_HOST, port=API_PORT)
@@ -1,47 +1,76 @@
-from flask import Flask, request, jsonify, send_from_directory
-from main import load_pdf, clean_text, generate_questions, save_to_pdf
+import os
+from flask import Flask, request, jsonify, send_from_directory, send_file
+from paper_jobs import PaperJobs, QueueFull, SyllabusUnavailable
 
 app = Flask(__name__, static_folder='frontend')
+jobs = PaperJobs()
+DIFFICULTIES = ("easy", "medium", "hard")
 
 @app.route("/")
 def index():
-    return send_from_directory('frontend', 'index.html')
+    return send_from_directory(os.path.dirname(os.path.abspath(__file__)), 'index.html')
+
+def job_view(job, deduplicated=False):
+    view = {k: job[k] for k in ("id", "status", "stage", "progress", "difficulty", "error")}
+    view.update(deduplicated=deduplicated, status_url=f"/jobs/{job['id']}", download_url=f"/jobs/{job['id']}/download" if job["status"] == "done" else None)
+    return view
+
+def submit_job(difficulty):
+    """(job view, None), or (None, (reason, HTTP status)) when the queue is full or the syllabus is missing."""
+    try:
+        job, deduplicated = jobs.submit(difficulty)
+    except QueueFull as e:
+        return None, (str(e), 503)
+    except SyllabusUnavailable as e:
+        return None, (str(e), 422)
+    return job_view(job, deduplicated), None
 
 @app.route("/chat", methods=["POST"])
 def chat():
     user_msg = request.json.get('message')
 
     if "generate" in user_msg.lower():
-        difficulty = "easy"  # Could parse message later
-        syllabus_path = "data/Syllabus.pdf"
-        raw_text = load_pdf(syllabus_path)
-        syllabus_text = clean_text(raw_text)
-
-        secA = generate_questions("Section A", syllabus_text, 10, 2, difficulty)
-        secB = generate_questions("Section B", syllabus_text, 5, 13, difficulty)
-        secC = generate_questions("Section C", syllabus_text, 1, 15, difficulty)
-
-        final_paper = f"""\
-QUESTION PAPER
-
-SECTION A (2 marks × 10 = 20 marks)
-
-{secA}
-
-SECTION B (13 marks × 5 = 65 marks)
+        difficulty = next((d for d in DIFFICULTIES if d in user_msg.lower()), "easy")
+        job, error = submit_job(difficulty)
+        if error:
+            reason, status = error
+            if status == 503:
+                return jsonify({"reply": f"❌ The generator is busy, please try again shortly ({reason})."}), status
+            return jsonify({"reply": f"❌ No syllabus to generate from ({reason})."}), status
+        if job["deduplicated"]:
+            reply = f"⏳ This syllabus already has a {difficulty} paper being generated; you will get the same one."
+        else:
+            reply = f"⏳ Generating question paper ({difficulty})..."
+        return jsonify({"reply": reply, "job": job})
 
-{secB}
+    return jsonify({"reply": "Hello! Type 'generate exam paper' (optionally easy, medium or hard) to create a new paper."})
 
-SECTION C (15 marks × 1 = 15 marks)
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    difficulty = (request.get_json(silent=True) or {}).get("difficulty", "easy")
+    if difficulty not in DIFFICULTIES:
+        return jsonify({"error": f"difficulty must be one of {', '.join(DIFFICULTIES)}"}), 400
+    job, error = submit_job(difficulty)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    return jsonify(job), 202
 
-{secC}
-"""
-        save_to_pdf("Question_Paper.pdf", final_paper)
-        reply = "✅ Question paper generated as 'Question_Paper.pdf'."
-    else:
-        reply = "Hello! Type 'generate exam paper' to create a new paper."
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job_view(job))
 
-    return jsonify({"reply": reply})
+@app.route("/jobs/<job_id>/download")
+def download(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": f"job is {job['status']}"}), 409
+    return send_file(job["file"], mimetype="application/pdf", as_attachment=True,
+                     download_name=f"Question_Paper_{job['difficulty']}_{job_id[:8]}.pdf")
 
 if __name__ == "__main__":
-    app.run(port=5000)
+    app.run(port=5000, threaded=True)
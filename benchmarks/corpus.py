@@ -0,0 +1,111 @@
+# benchmarks/corpus.py
+import os, random
+import docx
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+# Synthetic college handbook pages. Every document mixes filler sentences with "facts" about a
+# made-up place name, so each fact appears in exactly one chunk and a query about that place
+# has a known right answer. Tamil and Hindi go into DOCX/TXT only: reportlab's built-in fonts
+# have no glyphs for those scripts, so a PDF of them would only exercise OCR.
+
+LANGUAGES = {
+    "en": {
+        "filler": ["Students must carry their identity card inside the campus.", "The semester examination timetable is published on the notice board.",
+                   "Hostel fees are paid at the accounts office before the first week.", "The bus route list is updated at the start of every term.",
+                   "Scholarship applications need the mentor's signature.", "Laboratory records are submitted before the model examination."],
+        "fact": "{name} is next to the {place} and opens at {time}.",
+        "question": "Where is {name} and when does it open?",
+        "places": ["library", "canteen", "main gate", "sports ground", "auditorium"],
+    },
+    "fr": {
+        "filler": ["Les étudiants doivent porter leur carte d'identité sur le campus.", "Le calendrier des examens est affiché au tableau.",
+                   "Les frais d'internat sont payés au bureau comptable.", "La liste des lignes de bus est mise à jour chaque trimestre.",
+                   "Les demandes de bourse exigent la signature du tuteur.", "Les cahiers de laboratoire sont rendus avant l'examen blanc."],
+        "fact": "{name} se trouve près de {place} et ouvre à {time}.",
+        "question": "Où se trouve {name} et quand ouvre-t-il ?",
+        "places": ["la bibliothèque", "la cantine", "l'entrée principale", "le terrain de sport", "l'auditorium"],
+    },
+    "es": {
+        "filler": ["Los estudiantes deben llevar su carnet dentro del campus.", "El calendario de exámenes se publica en el tablón.",
+                   "Las tasas de la residencia se pagan en la oficina de cuentas.", "La lista de rutas de autobús se actualiza cada trimestre.",
+                   "Las solicitudes de beca necesitan la firma del tutor.", "Los cuadernos de laboratorio se entregan antes del examen."],
+        "fact": "{name} está junto a {place} y abre a las {time}.",
+        "question": "¿Dónde está {name} y a qué hora abre?",
+        "places": ["la biblioteca", "la cafetería", "la puerta principal", "el campo de deportes", "el auditorio"],
+    },
+    "ta": {
+        "filler": ["மாணவர்கள் வளாகத்திற்குள் அடையாள அட்டையை எடுத்துச் செல்ல வேண்டும்.", "பருவத் தேர்வு அட்டவணை அறிவிப்பு பலகையில் வெளியிடப்படும்.",
+                   "விடுதி கட்டணம் முதல் வாரத்திற்கு முன் கணக்கு அலுவலகத்தில் செலுத்தப்படும்.", "பேருந்து வழித்தடப் பட்டியல் ஒவ்வொரு பருவத்திலும் புதுப்பிக்கப்படும்."],
+        "fact": "{name} {place} அருகில் உள்ளது, {time} மணிக்கு திறக்கப்படும்.",
+        "question": "{name} எங்கே உள்ளது, எப்போது திறக்கப்படும்?",
+        "places": ["நூலகம்", "உணவகம்", "முதன்மை வாயில்", "விளையாட்டு மைதானம்"],
+    },
+    "hi": {
+        "filler": ["छात्रों को परिसर में अपना पहचान पत्र साथ रखना होगा।", "सेमेस्टर परीक्षा की समय सारणी सूचना पट्ट पर प्रकाशित की जाती है।",
+                   "छात्रावास शुल्क पहले सप्ताह से पहले लेखा कार्यालय में जमा होता है।", "बस मार्ग सूची हर सत्र की शुरुआत में अपडेट की जाती है।"],
+        "fact": "{name} {place} के पास है और {time} बजे खुलता है।",
+        "question": "{name} कहाँ है और कब खुलता है?",
+        "places": ["पुस्तकालय", "कैंटीन", "मुख्य द्वार", "खेल का मैदान"],
+    },
+}
+PDF_LANGUAGES = ("en", "fr", "es")
+FORMATS = ("pdf", "docx", "txt")
+
+def _name(rng, used):
+    # Made-up, pronounceable place names keep each fact unique to one chunk
+    while True:
+        name = "".join(rng.choice(s) for s in ("BKLMRTV", "aeiou", "lnrst", "aeiou", "dkmnrv", "aeo")).capitalize() + " Hall"
+        if name not in used:
+            used.add(name)
+            return name
+
+def _paragraphs(rng, lang, facts, paragraphs, used):
+    spec, paras, doc_facts = LANGUAGES[lang], [], []
+    for _ in range(paragraphs):
+        sentences = [rng.choice(spec["filler"]) for _ in range(rng.randint(4, 8))]
+        for _ in range(facts):
+            name, time = _name(rng, used), f"{rng.randint(6, 11)}:{rng.choice(['00', '15', '30', '45'])}"
+            sentences.insert(rng.randint(0, len(sentences)), spec["fact"].format(name=name, place=rng.choice(spec["places"]), time=time))
+            doc_facts.append({"name": name, "lang": lang, "question": spec["question"].format(name=name)})
+        paras.append(" ".join(sentences))
+    return paras, doc_facts
+
+def _write_pdf(path, paragraphs):
+    pdf = canvas.Canvas(path, pagesize=A4)
+    width, height = A4
+    y = height - 60
+    for para in paragraphs:
+        line = ""
+        for word in para.split() + [None]:
+            if word is None or pdf.stringWidth(line + " " + word, "Helvetica", 10) > width - 120:
+                pdf.setFont("Helvetica", 10)
+                pdf.drawString(60, y, line.strip())
+                y, line = y - 14, ""
+                if y < 60:
+                    pdf.showPage(); y = height - 60
+            if word is not None: line += " " + word
+        y -= 14 # Blank line between paragraphs
+    pdf.save()
+
+def _write_docx(path, paragraphs):
+    document = docx.Document()
+    for para in paragraphs: document.add_paragraph(para)
+    document.save(path)
+
+def _write_txt(path, paragraphs):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs))
+
+def generate_corpus(folder, n_docs=60, paragraphs=6, facts_per_paragraph=1, seed=0):
+    """Writes n_docs files cycling through PDF, DOCX and TXT and returns the planted facts with their source file."""
+    rng, used, facts = random.Random(seed), set(), []
+    os.makedirs(folder, exist_ok=True)
+    for i in range(n_docs):
+        fmt = FORMATS[i % len(FORMATS)]
+        lang = rng.choice(PDF_LANGUAGES if fmt == "pdf" else tuple(LANGUAGES))
+        paras, doc_facts = _paragraphs(rng, lang, facts_per_paragraph, paragraphs, used)
+        fname = f"bench_{i:04d}_{lang}.{fmt}"
+        {"pdf": _write_pdf, "docx": _write_docx, "txt": _write_txt}[fmt](os.path.join(folder, fname), paras)
+        facts += [{**fact, "source": fname} for fact in doc_facts]
+    return facts
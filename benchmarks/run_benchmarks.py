@@ -0,0 +1,203 @@
+# benchmarks/run_benchmarks.py
+import os, sys, json, time, random, asyncio, tempfile, platform, subprocess
+from datetime import datetime, timezone
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import PROJECT_ROOT, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, FAISS_INDEX_TYPE, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, K, HYBRID_CANDIDATES, FAKE_LLM_LATENCY_MS, FAKE_LLM_TOKEN_MS
+from benchmarks.corpus import generate_corpus
+from ingestion.load_documents import extract_text_from_file
+from processing.chunks_documents import chunk_document
+from embeddings.model_backend import load_encoder, EncoderEmbeddings
+from embeddings.faiss_index import effective_index_type, make_index, train_index, tune_index
+from embeddings.load_to_faiss import add_vectors, vector_ids
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from rag.lexical_index import LexicalIndex, HybridRetriever
+
+RESULTS_FOLDER = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+
+def percentiles(seconds):
+    if not seconds: return {}
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {"p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2), "mean_ms": round(1000 * float(np.mean(seconds)), 2)}
+
+def timed(stats, name, items, fn):
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    stats[name] = {"seconds": round(seconds, 4), "items": items(result) if callable(items) else items}
+    stats[name]["items_per_s"] = round(stats[name]["items"] / seconds, 1) if seconds else None
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def bench_ingestion(corpus_dir, files):
+    """Times every stage on the synthetic corpus and returns (stage stats, FAISS vectorstore)."""
+    stats, entries, by_format = {}, {}, {}
+    def extract():
+        for fname in files:
+            start = time.perf_counter()
+            entries[fname] = extract_text_from_file(os.path.join(corpus_dir, fname))
+            by_format.setdefault(os.path.splitext(fname)[1][1:], []).append(time.perf_counter() - start)
+        return entries
+    timed(stats, "extract", len(files), extract)
+    for fmt, seconds in sorted(by_format.items()):
+        stats[f"extract_{fmt}"] = {"seconds": round(sum(seconds), 4), "items": len(seconds), "per_file": percentiles(seconds)}
+    chunks = timed(stats, "chunk", lambda c: sum(len(v) for v in c.values()), lambda: {f: [c for c in chunk_document(e) if c["content"].strip()] for f, e in entries.items()})
+    model = timed(stats, "model_load", 1, load_encoder)
+    texts = [c["content"] for f in files for c in chunks[f]]
+    vectors = timed(stats, "encode", len(texts), lambda: model.encode(texts, batch_size=32, convert_to_numpy=True)).astype(np.float32)
+    def build():
+        index = make_index(vectors.shape[1], len(vectors), effective_index_type(len(vectors)))
+        if not index.is_trained: train_index(index, vectors)
+        vectorstore = FAISS(EncoderEmbeddings(), index, InMemoryDocstore(), {})
+        offset = 0
+        for fname in files:
+            file_chunks = chunks[fname]
+            add_vectors(vectorstore, vectors[offset:offset + len(file_chunks)], [c["content"] for c in file_chunks], [c["metadata"] for c in file_chunks], vector_ids(fname, len(file_chunks)))
+            offset += len(file_chunks)
+        tune_index(vectorstore.index)
+        return vectorstore
+    vectorstore = timed(stats, "index_build", len(texts), build)
+    vectorstore.lexical_index = timed(stats, "lexical_build", len(texts), lambda: _lexical(vectorstore))
+    return stats, vectorstore
+
+def _lexical(vectorstore):
+    lexical_index = LexicalIndex()
+    lexical_index.sync({_id: vectorstore.docstore.search(_id).page_content for _id in vectorstore.index_to_docstore_id.values()})
+    return lexical_index
+
+def bench_retrieval(vectorstore, facts, k):
+    """recall@k (a hit is a retrieved chunk from the right file containing the planted name) and per-query latency."""
+    retrievers = {"dense": lambda q: vectorstore.similarity_search(q, k=k)}
+    hybrid = HybridRetriever(vectorstore=vectorstore, lexical_index=vectorstore.lexical_index, k=k, candidates=max(k, HYBRID_CANDIDATES))
+    retrievers["hybrid"] = hybrid.invoke
+    results = {}
+    for name, retrieve in retrievers.items():
+        retrieve(facts[0]["question"]) # Warm-up
+        latencies, hits = [], {}
+        for fact in facts:
+            start = time.perf_counter()
+            docs = retrieve(fact["question"])
+            latencies.append(time.perf_counter() - start)
+            marker = fact["name"].split()[0]
+            hit = any(doc.metadata.get("source") == fact["source"] and marker in doc.page_content for doc in docs)
+            hits.setdefault(fact["lang"], []).append(hit)
+        all_hits = [h for lang_hits in hits.values() for h in lang_hits]
+        results[name] = {f"recall@{k}": round(float(np.mean(all_hits)), 4), "queries": len(all_hits), "latency": percentiles(latencies),
+                         "recall_by_language": {lang: round(float(np.mean(h)), 4) for lang, h in sorted(hits.items())}}
+    return results
+
+async def _load_test(client, questions, requests, concurrency, path="/chat"):
+    semaphore, latencies, errors = asyncio.Semaphore(concurrency), [], []
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, data={"query": questions[i % len(questions)], "session_id": f"bench-{i % concurrency}"})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - start
+    return {"requests": requests, "concurrency": concurrency, "errors": len(errors), "first_error": errors[0] if errors else None,
+            "throughput_rps": round(len(latencies) / wall, 2) if wall else None, "latency": percentiles(latencies)}
+
+def bench_chat(vectorstore, facts, requests, concurrency, llm_latency_ms, token_ms, url=None, answer_cache=False):
+    """Load-tests /chat in-process against the benchmark index and the stand-in LLM, or a running API at `url`."""
+    import httpx
+    questions = [fact["question"] for fact in facts]
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=120)
+    else:
+        import api.app as api
+        from rag.fake_llm import FakeChatModel
+        from rag.rag_chain import create_rag_chain
+        from rag.answer_cache import AnswerCache
+        vectorstore.index_version, vectorstore.index_folder = "benchmark", None
+        api.state.vectorstore = vectorstore
+        api.state.live = (create_rag_chain(vectorstore, llm=FakeChatModel(latency_ms=llm_latency_ms, token_ms=token_ms)), vectorstore.index_version)
+        # Off by default so runs stay comparable with results recorded before the answer cache existed
+        if answer_cache: api.state.answer_cache = AnswerCache(vectorstore.embedding_function, vectorstore.index_version)
+        api.state.ready.set()
+        # ASGITransport sends no lifespan events, so the app's own index loading never runs
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://benchmark", timeout=120)
+    async def run():
+        async with client:
+            return await _load_test(client, questions, requests, concurrency)
+    result = asyncio.run(run())
+    result["target"] = url or "in-process"
+    if not url: result.update(llm_latency_ms=llm_latency_ms, llm_token_ms=token_ms, answer_cache=answer_cache)
+    return result
+
+def compare(current, baseline_path):
+    """Prints the change of every numeric metric against an earlier results file."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    def flatten(d, prefix=""):
+        for key, value in d.items():
+            if isinstance(value, dict): yield from flatten(value, f"{prefix}{key}.")
+            elif isinstance(value, (int, float)) and not isinstance(value, bool): yield f"{prefix}{key}", value
+    old = dict(flatten({k: baseline.get(k, {}) for k in ("ingestion", "retrieval", "chat")}))
+    print(f"\nCompared with {baseline.get('commit')} ({os.path.basename(baseline_path)}):")
+    for key, value in flatten({k: current.get(k, {}) for k in ("ingestion", "retrieval", "chat")}):
+        if key in old and old[key]:
+            print(f"  {key:<45} {old[key]:>12} -> {value:<12} ({100 * (value - old[key]) / old[key]:+.1f}%)")
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, embedding, retrieval and /chat on a synthetic multilingual corpus.")
+    parser.add_argument("--docs", type=int, default=60, help="Synthetic documents to generate (cycling PDF, DOCX, TXT).")
+    parser.add_argument("--paragraphs", type=int, default=6, help="Paragraphs per document, each with one planted fact.")
+    parser.add_argument("--queries", type=int, default=200, help="Retrieval queries (sampled from the planted facts).")
+    parser.add_argument("--k", type=int, default=K, help="K for recall@K.")
+    parser.add_argument("--chat-requests", type=int, default=200, help="/chat requests in the load test; 0 skips it.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent /chat requests.")
+    parser.add_argument("--llm-latency-ms", type=float, default=FAKE_LLM_LATENCY_MS, help="Stand-in LLM delay before the first token.")
+    parser.add_argument("--llm-token-ms", type=float, default=FAKE_LLM_TOKEN_MS, help="Stand-in LLM delay per token.")
+    parser.add_argument("--answer-cache", action="store_true", help="Serve the in-process load test through the semantic answer cache.")
+    parser.add_argument("--chat-url", help="Load-test a running API (e.g. http://127.0.0.1:8000) instead of an in-process one.")
+    parser.add_argument("--corpus-dir", help="Keep the generated corpus here instead of a temporary folder.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Results file (default: benchmarks/results/<timestamp>_<commit>.json).")
+    parser.add_argument("--compare", help="Earlier results file to print deltas against.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = args.corpus_dir or tmp
+        start = time.perf_counter()
+        facts = generate_corpus(corpus_dir, args.docs, args.paragraphs, seed=args.seed)
+        files = sorted({fact["source"] for fact in facts})
+        print(f"Generated {len(files)} documents with {len(facts)} planted facts in {time.perf_counter() - start:.1f}s")
+        ingestion, vectorstore = bench_ingestion(corpus_dir, files)
+    for name, s in ingestion.items(): print(f"  {name:<14} {s['seconds']:9.3f}s  {s['items']:>7} items")
+    queries = random.Random(args.seed).sample(facts, min(args.queries, len(facts)))
+    retrieval = bench_retrieval(vectorstore, queries, args.k)
+    for name, r in retrieval.items(): print(f"  {name:<7} recall@{args.k}={r[f'recall@{args.k}']:.3f}  p50={r['latency']['p50_ms']}ms  p99={r['latency']['p99_ms']}ms  by language {r['recall_by_language']}")
+    chat = bench_chat(vectorstore, queries, args.chat_requests, args.concurrency, args.llm_latency_ms, args.llm_token_ms, args.chat_url, args.answer_cache) if args.chat_requests else None
+    if chat: print(f"  /chat   {chat['throughput_rps']} req/s  p50={chat['latency'].get('p50_ms')}ms  p99={chat['latency'].get('p99_ms')}ms  errors={chat['errors']}")
+
+    commit = git_commit()
+    results = {
+        "commit": commit, "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "config": {"embedding_model": EMBEDDING_MODEL_NAME, "embedding_backend": EMBEDDING_BACKEND, "faiss_index_type": FAISS_INDEX_TYPE,
+                   "chunk_max_tokens": CHUNK_MAX_TOKENS, "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS, "docs": len(files), "facts": len(facts), "k": args.k},
+        "ingestion": ingestion, "retrieval": retrieval, "chat": chat,
+    }
+    out = args.out or os.path.join(RESULTS_FOLDER, f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}_{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {out}")
+    if args.compare: compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
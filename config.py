@@ -14,31 +14,115 @@ DATA_FOLDER = os.path.join(PROJECT_ROOT, "data")
 PROCESSED_DOCS_FOLDER = os.path.join(PROJECT_ROOT, "processed_docs")
 CHUNKS_FOLDER = os.path.join(PROJECT_ROOT, "chunks")
 EMBEDDINGS_FOLDER = os.path.join(PROJECT_ROOT, "embeddings")
+MANIFEST_PATH = os.path.join(PROJECT_ROOT, "manifest.json") # Content hashes shared by every pipeline stage
 
 
 # --- MODEL CONFIGURATION ---
 EMBEDDING_MODEL_NAME = "intfloat/multilingual-e5-large"
+EMBEDDING_BACKEND = "torch" # "torch" (fp32 PyTorch), "onnx" (ONNX Runtime) or "onnx_int8" (dynamically quantized ONNX)
+EMBEDDING_QUANTIZATION_CONFIG = "avx2" # CPU target for onnx_int8: "arm64", "avx2", "avx512" or "avx512_vnni"
 LLM_NAME = "gemini-1.5-flash"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini") # "gemini", or "fake" for the offline stand-in used by benchmarks
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", 300)) # Stand-in LLM: delay before the first token
+FAKE_LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", 10)) # Stand-in LLM: delay per generated token
 
 
 # --- VECTOR STORE CONFIGURATION ---
 MODEL_SUBFOLDER = EMBEDDING_MODEL_NAME.split('/')[-1]
 FAISS_INDEX_PATH = os.path.join(EMBEDDINGS_FOLDER, MODEL_SUBFOLDER, "faiss_index")
+INDEX_KEEP_VERSIONS = 3 # Published index snapshots kept on disk (older ones are deleted)
+INDEX_RELOAD_INTERVAL = 10 # Seconds between the API's checks for a newer snapshot; 0 disables hot reload
+FAISS_INDEX_TYPE = "flat" # "flat" (exact), "ivf_flat", "hnsw" or "ivf_pq"
+FAISS_IVF_NLIST = 0 # IVF cells; 0 picks ~4*sqrt(n) at build time
+FAISS_IVF_NPROBE = 16 # IVF cells scanned per query
+FAISS_HNSW_M = 32
+FAISS_HNSW_EF_CONSTRUCTION = 200
+FAISS_HNSW_EF_SEARCH = 64
+FAISS_PQ_M = 64 # PQ sub-quantizers; must divide the embedding dimension (1024)
+FAISS_PQ_NBITS = 8
+FAISS_MIN_TRAIN_SIZE = 10_000 # Below this many vectors IVF types fall back to an exact flat index
+FAISS_RETRAIN_GROWTH = 2.0 # IVF indexes are retrained once the corpus grows past this multiple of the trained size
+EMBED_BATCHING = True # Coalesce concurrent query embeddings into one encode call
+EMBED_BATCH_MAX_SIZE = 32
+EMBED_BATCH_WINDOW_MS = 3 # How long a batch waits for more queries before encoding
+EMBEDDING_STORE_DTYPE = "float16" # On-disk dtype of embedding shards ("float16" or "float32")
+EMBEDDING_CACHE_PATH = os.path.join(EMBEDDINGS_FOLDER, MODEL_SUBFOLDER, "embedding_cache.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = 500_000 # Least recently used vectors are evicted beyond this
 
 
 # --- DATA PROCESSING CONFIGURATION ---
-CHUNK_SIZE = 800
-CHUNK_OVERLAP = 100
-MIN_CHUNK_SIZE = 50
+EMBEDDING_MAX_TOKENS = 512 # Input window of the embedding model; tokens beyond it are truncated away
+CHUNK_MAX_TOKENS = 480 # Chunk budget in embedding-model tokens, leaving room for special tokens within EMBEDDING_MAX_TOKENS
+CHUNK_OVERLAP_TOKENS = 48 # Overlap between the pieces of a paragraph longer than CHUNK_MAX_TOKENS
+DEDUP_ENABLED = True # Collapse near-duplicate chunks (letterheads, disclaimers, repeated sections) into one vector
+NEAR_DUPLICATES_FOLDER = os.path.join(PROJECT_ROOT, "near_duplicates") # MinHash signatures per source plus the duplicate map
+DEDUP_THRESHOLD = 0.9 # Estimated Jaccard similarity of word shingles at or above which two chunks are the same passage
+DEDUP_SHINGLE_WORDS = 3 # Words per shingle
+DEDUP_NUM_PERM = 64 # MinHash signature length (a power of two); 4 bytes per value, so 256 bytes per chunk in memory
+DEDUP_BANDS = 16 # LSH bands of DEDUP_NUM_PERM / DEDUP_BANDS values; chunks sharing any band are compared
+INGESTION_WORKERS = max(1, (os.cpu_count() or 2) - 1) # Processes used to extract files in parallel (1 = sequential)
+OCR_WORKERS = 2 # Pages OCR'd concurrently per PDF (bounds peak memory to this many page images)
+OCR_DPI = 300
+OCR_MIN_PAGE_CHARS = 50 # Pages whose text layer is shorter than this are OCR'd
+
+
+# --- STREAMING PIPELINE CONFIGURATION ---
+PIPELINE_QUEUE_SIZE = 16 # Max documents waiting between two stages
+PIPELINE_ENCODE_BATCH = 256 # Chunks gathered across documents per encoder call
+PIPELINE_WRITE_INTERMEDIATE = False # Also write processed_docs/ and chunks/ JSON for debugging
 
 
 # --- RAG CHAIN CONFIGURATION ---
 K = 5 # Number of search results to return
+HYBRID_SEARCH = True # Fuse BM25 keyword results with FAISS results (reciprocal rank fusion)
+HYBRID_CANDIDATES = 20 # Results taken from each retriever before fusion
+RRF_K = 60
+BM25_K1 = 1.5
+BM25_B = 0.75
 TEMPERATURE = 0.7
 MAX_NEW_TOKENS = 1024
+REWRITE_CACHE_SIZE = 2048 # Cached standalone-question rewrites
+REWRITE_HISTORY_MESSAGES = 4 # Recent messages that key the rewrite cache
+REWRITE_HEURISTIC = True # Skip the rewrite LLM call for questions with no follow-up cues (English only)
+ANSWER_CACHE_ENABLED = True # Reuse answers to near-identical standalone questions and merge identical in-flight ones
+ANSWER_CACHE_THRESHOLD = 0.95 # Minimum cosine similarity between question embeddings for a cache hit
+ANSWER_CACHE_TTL_SECONDS = 60 * 60 # Cached answers expire after this; a new index version clears them at once
+ANSWER_CACHE_MAX_ENTRIES = 5000
+METRICS_ENABLED = True # Per-stage latency histograms, token and cache counters served at /metrics
+TRACE_HEADERS = True # Return X-Trace-Id and Server-Timing (per-stage durations) headers on chat responses
+
+
+# --- SESSION MEMORY CONFIGURATION ---
+SESSION_BACKEND = "memory" # "memory" (per process) or "sqlite" (survives restarts, shared by workers)
+SESSION_DB_PATH = os.path.join(PROJECT_ROOT, "sessions", "sessions.sqlite")
+SESSION_MAX_SESSIONS = 10_000 # Least recently used sessions are evicted beyond this
+SESSION_TTL_SECONDS = 6 * 60 * 60 # Sessions idle longer than this are dropped
+SESSION_MAX_MESSAGES = 40 # Messages kept per session
+HISTORY_MAX_TOKENS = 1500 # Approximate token budget of chat history sent to each prompt
 
 
 # --- API & FRONTEND CONFIGURATION ---
 API_HOST = "127.0.0.1"
 API_PORT = 8000
-API_URL = f"http://{API_HOST}:{API_PORT}/chat"
\ No newline at end of file
+API_URL = f"http://{API_HOST}:{API_PORT}/chat"
+API_STREAM_URL = f"http://{API_HOST}:{API_PORT}/chat/stream"
+API_WORKERS = 1 # uvicorn worker processes; with more than one they share a single embedding server
+EMBEDDING_SERVER = os.getenv("EMBEDDING_SERVER", "") == "1" # Embed queries through the shared embedding server instead of in-process
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", os.path.join(PROJECT_ROOT, "embedding_server.sock"))
+EMBEDDING_SERVER_AUTHKEY = os.getenv("EMBEDDING_SERVER_AUTHKEY", "") # Shared secret checked on every connection; empty = use the key file
+EMBEDDING_SERVER_KEY_FILE = EMBEDDING_SERVER_SOCKET + ".key" # Random secret a server started without EMBEDDING_SERVER_AUTHKEY writes (mode 0600) for its clients
+
+# --- EXAM PAPER GENERATOR (main.py / app.py) ---
+SYLLABUS_PATH = os.path.join(DATA_FOLDER, "Syllabus.pdf")
+SYLLABUS_CACHE_FOLDER = os.path.join(PROJECT_ROOT, "syllabus_cache") # Extracted, cleaned and unit-split syllabi keyed by PDF content hash
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434") # Local model server (ollama serve, or fake_ollama.py in tests)
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma:2b")
+OLLAMA_KEEP_ALIVE = "30m" # Keep the model loaded between papers instead of reloading it per request
+OLLAMA_POOL_SIZE = 6 # Pooled keep-alive connections; at least 3 sections x PAPER_JOB_WORKERS
+OLLAMA_CONNECT_TIMEOUT = 5 # Seconds to open a connection to the model server
+OLLAMA_SECTION_TIMEOUT = 180 # Seconds one attempt at a section may take, first token to last
+OLLAMA_RETRIES = 2 # Extra attempts per section after a timeout, dropped connection or 5xx
+PAPER_OUTPUT_FOLDER = os.path.join(PROJECT_ROOT, "papers") # One PDF per generation job
+PAPER_JOB_WORKERS = 2 # Papers generated at the same time; each runs its three sections in parallel
+PAPER_MAX_PENDING = 20 # Queued + running jobs accepted before new requests are turned away
+PAPER_JOB_RETENTION_SECONDS = 24 * 60 * 60 # Finished jobs and their PDFs are deleted after this
@@ -0,0 +1,54 @@
+# embeddings/check_backend_recall.py
+import os, sys, time, json
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import EMBEDDING_BACKEND
+from ingestion.manifest import load_manifest
+from embeddings.embedding_store import read_table
+from embeddings.model_backend import load_encoder
+
+def sample_texts(n, seed=0):
+    texts = []
+    for entry in load_manifest().values():
+        if entry.get("shard"): texts.extend(read_table(entry["shard"])[0])
+    rng = np.random.default_rng(seed)
+    return [texts[i] for i in rng.choice(len(texts), size=min(n, len(texts)), replace=False)]
+
+def encode_timed(backend, texts):
+    encoder = load_encoder(backend)
+    encoder.encode(texts[:8]) # warm-up
+    start = time.perf_counter()
+    vectors = encoder.encode(texts, batch_size=32, convert_to_numpy=True)
+    return vectors.astype(np.float32), time.perf_counter() - start
+
+def top_k(corpus, queries, k):
+    # Same L2 ranking the flat FAISS index uses
+    dists = (queries ** 2).sum(1)[:, None] - 2 * queries @ corpus.T + (corpus ** 2).sum(1)[None, :]
+    return np.argsort(dists, axis=1)[:, :k]
+
+def check_recall(backend, n_docs=2000, n_queries=200, k=5):
+    """recall@k of `backend` against the fp32 PyTorch baseline, using stored chunks as documents and queries."""
+    texts = sample_texts(n_docs)
+    if not texts: raise SystemExit("No stored chunks found; run the ingestion pipeline first.")
+    queries = texts[:n_queries]
+    base, base_time = encode_timed("torch", texts)
+    cand, cand_time = encode_timed(backend, texts)
+    # Queries are re-encoded separately so each is ranked against the corpus like a real search
+    base_hits = top_k(base, load_encoder("torch").encode(queries, convert_to_numpy=True).astype(np.float32), k)
+    cand_hits = top_k(cand, load_encoder(backend).encode(queries, convert_to_numpy=True).astype(np.float32), k)
+    recall = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(base_hits, cand_hits)]))
+    cosine = float(np.mean((base * cand).sum(1) / (np.linalg.norm(base, axis=1) * np.linalg.norm(cand, axis=1))))
+    return {"backend": backend, "docs": len(texts), "queries": len(queries), "k": k, f"recall@{k}": round(recall, 4),
+            "mean_cosine_to_fp32": round(cosine, 5), "fp32_texts_per_s": round(len(texts) / base_time, 1),
+            "backend_texts_per_s": round(len(texts) / cand_time, 1), "speedup": round(base_time / cand_time, 2)}
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compare an embedding backend's retrieval results with the fp32 PyTorch model.")
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, help="Backend to check (onnx or onnx_int8).")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(check_recall(args.backend, args.docs, args.queries, args.k), indent=2))
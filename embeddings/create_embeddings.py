@@ -1,9 +1,13 @@
 # embeddings/create_embeddings.py
 import os, json, sys
-from sentence_transformers import SentenceTransformer
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config import CHUNKS_FOLDER, EMBEDDINGS_FOLDER, EMBEDDING_MODEL_NAME
+from ingestion.manifest import load_manifest, save_manifest, stale_files, mark_done
+from embeddings.embedding_store import shard_name, write_shard, remove_shard
+from embeddings.embedding_cache import EmbeddingCache, encode_with_cache
+from embeddings.model_backend import load_encoder, encoder_signature
+from processing.dedup_chunks import load_near_duplicates
 
 MODEL_SUBFOLDER = EMBEDDING_MODEL_NAME.split('/')[-1]
 MODEL_EMBEDDINGS_FOLDER = os.path.join(EMBEDDINGS_FOLDER, MODEL_SUBFOLDER)
@@ -13,38 +17,45 @@ def load_chunks(file_path):
     with open(file_path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def load_existing_embeddings(file_path):
-    if os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+def get_model():
+    return load_encoder()
 
-def save_embeddings(data, file_path):
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def invalidate_stale_embeddings(manifest):
+    # Sources embedded into the old *_embeddings.json format, or by another backend, are re-embedded
+    for fname, entry in manifest.items():
+        if entry.get("shard") and entry.get("encoder", EMBEDDING_MODEL_NAME) != encoder_signature():
+            entry["embedded"] = None
+        if entry.get("embedded") and "shard" not in entry:
+            entry["embedded"] = None
+        legacy_path = os.path.join(MODEL_EMBEDDINGS_FOLDER, fname + "_embeddings.json")
+        if os.path.exists(legacy_path): os.remove(legacy_path)
 
 def main():
-    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-    chunk_files = [f for f in os.listdir(CHUNKS_FOLDER) if f.endswith('_chunks.json')]
-    for chunk_file in chunk_files:
-        chunk_path = os.path.join(CHUNKS_FOLDER, chunk_file)
-        embedding_path = os.path.join(MODEL_EMBEDDINGS_FOLDER, chunk_file.replace('_chunks.json', '_embeddings.json'))
-        chunks = load_chunks(chunk_path)
-        existing_embeddings = load_existing_embeddings(embedding_path)
-        processed_keys = {f"{item['metadata'].get('source')}|{hash(item.get('content',''))}" for item in existing_embeddings}
-        new_data = []
-        for chunk in chunks:
-            text = chunk["content"].strip()
-            if not text: continue
-            key = f"{chunk['metadata'].get('source')}|{hash(text)}"
-            if key in processed_keys: continue
-            new_data.append(chunk)
-        if not new_data: continue
-        texts = [c["content"] for c in new_data]
-        embeddings = model.encode(texts, batch_size=32, show_progress_bar=True, convert_to_numpy=True)
-        for emb, meta, txt in zip(embeddings, [c["metadata"] for c in new_data], texts):
-            existing_embeddings.append({"embedding": emb.tolist(), "metadata": meta, "content": txt})
-        save_embeddings(existing_embeddings, embedding_path)
+    manifest = load_manifest()
+    invalidate_stale_embeddings(manifest)
+    stale = stale_files(manifest, "embedded")
+    if not stale: return
+    cache = EmbeddingCache()
+    duplicates = load_near_duplicates()["duplicates"]
+    skipped = 0
+    for fname in stale:
+        entry = manifest[fname]
+        chunk_path = os.path.join(CHUNKS_FOLDER, fname + "_chunks.json")
+        chunks = load_chunks(chunk_path) if entry.get("chunked") and os.path.exists(chunk_path) else []
+        # Near-duplicates of a chunk embedded elsewhere get no vector of their own
+        new_data = [c for c in chunks if c["content"].strip() and str(c["metadata"].get("chunk_id")) not in duplicates.get(fname, {})]
+        skipped += len([c for c in chunks if c["content"].strip()]) - len(new_data)
+        if entry.get("shard"): remove_shard(entry["shard"])
+        entry["shard"] = None
+        if new_data:
+            texts = [c["content"] for c in new_data]
+            embeddings = encode_with_cache(texts, cache, get_model)
+            entry["shard"] = write_shard(shard_name(fname, entry["chunked"]), embeddings, texts, [c["metadata"] for c in new_data])
+            entry["encoder"] = encoder_signature()
+        mark_done(manifest, fname, "embedded")
+        save_manifest(manifest)
+    print(f"Embedding cache: {cache.hits} hits, {cache.misses} misses; {skipped} near-duplicate chunks skipped")
+    cache.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
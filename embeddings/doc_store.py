@@ -0,0 +1,132 @@
+# embeddings/doc_store.py
+import os, json
+from collections.abc import Mapping
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+# Columnar, read-only docstore saved next to index.faiss. Row i belongs to FAISS position i:
+#   text.bin / text_offsets.npy    all chunk contents as one UTF-8 blob plus n+1 byte offsets
+#   ids.bin / id_offsets.npy       docstore ids, and id_order.npy (rows sorted by id) for lookups
+#   columns.npy                    source and type as codes into vocab.json, page and chunk_id; -1 = absent
+#   extra.bin / extra_offsets.npy  any other metadata keys as JSON, empty for most rows
+# Everything is memory-mapped, so a Document is only decoded for the rows a query returns.
+
+DOCSTORE_FOLDER = "docstore"
+COLUMNS = np.dtype([("source", "<i4"), ("page", "<i4"), ("type", "<i2"), ("chunk_id", "<i4")])
+_VOCAB_KEYS, _INT_KEYS = ("source", "type"), ("page", "chunk_id")
+
+def _is_int(value):
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool) and 0 <= value < 2**31
+
+def _blob(parts):
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in parts], out=offsets[1:])
+    return b"".join(parts), offsets
+
+def write_docstore(folder, ids, documents):
+    """Writes the documents in FAISS position order; each file is swapped in atomically."""
+    path = os.path.join(folder, DOCSTORE_FOLDER)
+    os.makedirs(path, exist_ok=True)
+    vocab = {key: {} for key in _VOCAB_KEYS}
+    columns = np.full(len(documents), -1, dtype=COLUMNS)
+    extras = []
+    for row, doc in enumerate(documents):
+        extra = dict(doc.metadata)
+        for key in _VOCAB_KEYS:
+            if isinstance(extra.get(key), str):
+                columns[key][row] = vocab[key].setdefault(extra.pop(key), len(vocab[key]))
+        for key in _INT_KEYS:
+            if _is_int(extra.get(key)): columns[key][row] = extra.pop(key)
+        extras.append(json.dumps(extra, ensure_ascii=False).encode("utf-8") if extra else b"")
+    id_parts = [str(i).encode("utf-8") for i in ids]
+    files = {"columns.npy": columns, "vocab.json": {key: list(codes) for key, codes in vocab.items()},
+             "id_order.npy": np.array(sorted(range(len(id_parts)), key=id_parts.__getitem__), dtype=np.int64)}
+    files["text.bin"], files["text_offsets.npy"] = _blob([doc.page_content.encode("utf-8") for doc in documents])
+    files["ids.bin"], files["id_offsets.npy"] = _blob(id_parts)
+    files["extra.bin"], files["extra_offsets.npy"] = _blob(extras)
+    for name, data in files.items():
+        tmp = os.path.join(path, name + ".tmp")
+        with open(tmp, "wb") as f:
+            if name.endswith(".npy"): np.save(f, data)
+            elif name.endswith(".json"): f.write(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+            else: f.write(data)
+    # vocab.json goes last: a reader never sees codes that point past the vocabulary
+    for name in sorted(files, key=lambda n: n == "vocab.json"):
+        os.replace(os.path.join(path, name + ".tmp"), os.path.join(path, name))
+
+def docstore_exists(folder):
+    return os.path.exists(os.path.join(folder, DOCSTORE_FOLDER, "vocab.json"))
+
+class ColumnarDocstore(Docstore):
+    """Read-only docstore over the memory-mapped columns written by write_docstore()."""
+
+    def __init__(self, folder):
+        path = os.path.join(folder, DOCSTORE_FOLDER)
+        with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        blob = lambda name: np.memmap(os.path.join(path, name), dtype=np.uint8, mode="r") if os.path.getsize(os.path.join(path, name)) else np.zeros(0, dtype=np.uint8)
+        self.text, self.text_offsets = blob("text.bin"), load("text_offsets.npy")
+        self.ids, self.id_offsets, self.id_order = blob("ids.bin"), load("id_offsets.npy"), load("id_order.npy")
+        self.extra, self.extra_offsets = blob("extra.bin"), load("extra_offsets.npy")
+        self.columns = load("columns.npy")
+
+    def __len__(self):
+        return len(self.columns)
+
+    def id_at(self, row):
+        return self.ids[self.id_offsets[row]:self.id_offsets[row + 1]].tobytes().decode("utf-8")
+
+    def row_of(self, doc_id):
+        key, lo, hi = str(doc_id).encode("utf-8"), 0, len(self.id_order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = int(self.id_order[mid])
+            if self.ids[self.id_offsets[row]:self.id_offsets[row + 1]].tobytes() < key: lo = mid + 1
+            else: hi = mid
+        if lo < len(self.id_order) and self.id_at(int(self.id_order[lo])) == str(doc_id): return int(self.id_order[lo])
+        return None
+
+    def document(self, row):
+        columns = self.columns[row]
+        metadata = {}
+        for key in COLUMNS.names:
+            value = int(columns[key])
+            if value >= 0: metadata[key] = self.vocab[key][value] if key in _VOCAB_KEYS else value
+        start, end = self.extra_offsets[row], self.extra_offsets[row + 1]
+        if end > start: metadata.update(json.loads(self.extra[start:end].tobytes().decode("utf-8")))
+        content = self.text[self.text_offsets[row]:self.text_offsets[row + 1]].tobytes().decode("utf-8")
+        return Document(id=self.id_at(row), page_content=content, metadata=metadata)
+
+    def search(self, search):
+        row = self.row_of(search)
+        return f"ID {search} not found." if row is None else self.document(row)
+
+class RowIdMapping(Mapping):
+    """FAISS position -> docstore id, read lazily from the id column instead of a dict of every chunk."""
+
+    def __init__(self, docstore):
+        self.docstore = docstore
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self.docstore): raise KeyError(position)
+        return self.docstore.id_at(int(position))
+
+    def __iter__(self):
+        return iter(range(len(self.docstore)))
+
+    def __len__(self):
+        return len(self.docstore)
+
+def load_docstore(folder):
+    """(ColumnarDocstore, RowIdMapping) for serving; nothing but the vocabulary is read up front."""
+    docstore = ColumnarDocstore(folder)
+    return docstore, RowIdMapping(docstore)
+
+def load_docstore_in_memory(folder):
+    """Decodes every row into an InMemoryDocstore so the index builder can add and delete documents."""
+    columnar = ColumnarDocstore(folder)
+    documents = [columnar.document(row) for row in range(len(columnar))]
+    return InMemoryDocstore({doc.id: doc for doc in documents}), {row: doc.id for row, doc in enumerate(documents)}
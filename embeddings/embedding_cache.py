@@ -0,0 +1,76 @@
+# embeddings/embedding_cache.py
+import os, sys, time, sqlite3, hashlib, unicodedata, re
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_STORE_DTYPE
+from embeddings.model_backend import encoder_signature
+
+def normalize_text(text):
+    return re.sub(r'\s+', ' ', unicodedata.normalize("NFKC", text)).strip()
+
+class EmbeddingCache:
+    """SQLite-backed vector cache shared by every document and run, keyed by sha256(model + backend + normalized text)."""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, model_name=None, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.model_name = model_name or encoder_signature()
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self.conn.commit()
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts):
+        keys = [self.key(t) for t in texts]
+        found = {}
+        for start in range(0, len(keys), 500):
+            batch = list(set(keys[start:start + 500]))
+            rows = self.conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch).fetchall()
+            found.update({k: np.frombuffer(v, dtype=EMBEDDING_STORE_DTYPE) for k, v in rows})
+        if found:
+            now = time.time()
+            self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            self.conn.commit()
+        results = [found.get(k) for k in keys]
+        hits = sum(r is not None for r in results)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many(self, texts, vectors):
+        now = time.time()
+        rows = [(self.key(t), np.asarray(v, dtype=EMBEDDING_STORE_DTYPE).tobytes(), now) for t, v in zip(texts, vectors)]
+        self.conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries: return
+        # Drop the least recently used entries down to 90% of the cap so eviction doesn't run on every put
+        excess = count - int(self.max_entries * 0.9)
+        self.conn.execute("DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def encode_with_cache(texts, cache, get_model, batch_size=32):
+    """Returns an (n, dim) array for `texts`, running the encoder only on texts the cache hasn't seen."""
+    vectors = cache.get_many(texts)
+    missing = {}
+    for i, vec in enumerate(vectors):
+        if vec is None: missing.setdefault(cache.key(texts[i]), []).append(i)
+    if missing:
+        unique_texts = [texts[positions[0]] for positions in missing.values()]
+        encoded = get_model().encode(unique_texts, batch_size=batch_size, show_progress_bar=True, convert_to_numpy=True)
+        cache.put_many(unique_texts, encoded)
+        for positions, vec in zip(missing.values(), encoded):
+            for i in positions: vectors[i] = vec
+    return np.vstack(vectors)
@@ -0,0 +1,47 @@
+# embeddings/embedding_store.py
+import os, json, sys, hashlib
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import EMBEDDINGS_FOLDER, EMBEDDING_MODEL_NAME, EMBEDDING_STORE_DTYPE
+
+MODEL_SUBFOLDER = EMBEDDING_MODEL_NAME.split('/')[-1]
+STORE_FOLDER = os.path.join(EMBEDDINGS_FOLDER, MODEL_SUBFOLDER, "store")
+
+# One immutable shard per (source file, content hash): a .npy matrix that can be memory-mapped
+# plus a .jsonl side table with the content and metadata of each row. A re-embedded source
+# gets a new shard and its old one is dropped, so existing shards are never rewritten.
+
+def shard_name(fname, content_hash):
+    return f"{hashlib.sha256(fname.encode('utf-8')).hexdigest()[:16]}-{content_hash[:16]}"
+
+def _paths(name):
+    return os.path.join(STORE_FOLDER, name + ".npy"), os.path.join(STORE_FOLDER, name + ".jsonl")
+
+def write_shard(name, vectors, texts, metadatas):
+    os.makedirs(STORE_FOLDER, exist_ok=True)
+    vec_path, table_path = _paths(name)
+    with open(table_path + ".tmp", "w", encoding="utf-8") as f:
+        for text, metadata in zip(texts, metadatas):
+            f.write(json.dumps({"content": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+    with open(vec_path + ".tmp", "wb") as f:
+        np.save(f, np.asarray(vectors, dtype=EMBEDDING_STORE_DTYPE))
+    os.replace(table_path + ".tmp", table_path)
+    os.replace(vec_path + ".tmp", vec_path)
+    return name
+
+def read_vectors(name):
+    return np.load(_paths(name)[0], mmap_mode="r")
+
+def read_table(name):
+    texts, metadatas = [], []
+    with open(_paths(name)[1], "r", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            texts.append(row["content"])
+            metadatas.append(row["metadata"])
+    return texts, metadatas
+
+def remove_shard(name):
+    for path in _paths(name):
+        if os.path.exists(path): os.remove(path)
@@ -0,0 +1,80 @@
+# embeddings/faiss_index.py
+import os, sys, json, math
+import numpy as np
+import faiss
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import (FAISS_INDEX_TYPE, FAISS_IVF_NLIST, FAISS_IVF_NPROBE, FAISS_HNSW_M, FAISS_HNSW_EF_CONSTRUCTION, FAISS_HNSW_EF_SEARCH,
+                    FAISS_PQ_M, FAISS_PQ_NBITS, FAISS_MIN_TRAIN_SIZE, FAISS_RETRAIN_GROWTH)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+TRAINED_TYPES = ("ivf_flat", "ivf_pq")
+META_FILE = "index_meta.json"
+
+def effective_index_type(n_vectors, index_type=FAISS_INDEX_TYPE):
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS_INDEX_TYPE '{index_type}', expected one of {INDEX_TYPES}.")
+    # IVF centroids and PQ codebooks need enough vectors to train on; small corpora stay exact
+    if index_type in TRAINED_TYPES and n_vectors < FAISS_MIN_TRAIN_SIZE: return "flat"
+    return index_type
+
+def ivf_nlist(n_vectors):
+    nlist = FAISS_IVF_NLIST or int(4 * math.sqrt(n_vectors))
+    return max(1, min(nlist, n_vectors // 39))
+
+def make_index(dim, n_vectors, index_type):
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M)
+        index.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+        return index
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        return faiss.IndexIVFFlat(quantizer, dim, ivf_nlist(n_vectors))
+    return faiss.IndexIVFPQ(quantizer, dim, ivf_nlist(n_vectors), FAISS_PQ_M, FAISS_PQ_NBITS)
+
+def train_index(index, sample):
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+    return index
+
+def tune_index(index):
+    # Search-time knobs are applied on every load so config changes need no rebuild
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+    else:
+        try:
+            faiss.extract_index_ivf(index).nprobe = FAISS_IVF_NPROBE
+        except RuntimeError:
+            pass
+    return index
+
+def read_index_mmap(path, index_type):
+    """Memory-maps a saved index read-only so vectors are paged in on demand and shared between processes."""
+    if index_type in TRAINED_TYPES:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    else:
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    try:
+        return faiss.read_index(path, flags)
+    except RuntimeError:
+        return faiss.read_index(path) # Older faiss builds can't mmap every index type
+
+def read_index_meta(folder):
+    path = os.path.join(folder, META_FILE)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"configured": "flat", "type": "flat", "built_size": 0} # Indexes saved before index types existed
+
+def write_index_meta(folder, meta):
+    with open(os.path.join(folder, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+def needs_rebuild(meta, ntotal, modified):
+    """Whether an existing index must be rebuilt rather than updated in place."""
+    if meta.get("configured") != FAISS_INDEX_TYPE: return True
+    # Only the flat index compacts ids on removal the way the LangChain docstore mapping expects
+    if modified and meta.get("type") != "flat": return True
+    return FAISS_INDEX_TYPE in TRAINED_TYPES and ntotal > FAISS_RETRAIN_GROWTH * max(meta.get("built_size", 0), 1)
@@ -0,0 +1,58 @@
+# embeddings/index_snapshots.py
+import os, sys, shutil
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import FAISS_INDEX_PATH, INDEX_KEEP_VERSIONS
+
+# Every save of the index is a new immutable folder, FAISS_INDEX_PATH/versions/vNNNNNN, holding
+# index.faiss, docstore/, index_meta.json and lexical_index.json. FAISS_INDEX_PATH/CURRENT names the
+# published one and is replaced atomically, so readers see either the old snapshot or the new one
+# in full, and a reader still using an old snapshot keeps it until the next few versions are written.
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_FOLDER = "versions"
+LEGACY_VERSION = "legacy" # Index saved straight into FAISS_INDEX_PATH before snapshots existed
+
+def current_snapshot(root=FAISS_INDEX_PATH):
+    """(version, folder) of the published snapshot, or (None, None) when no index has been built."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+        return version, os.path.join(root, VERSIONS_FOLDER, version)
+    except FileNotFoundError:
+        if os.path.exists(os.path.join(root, "index.faiss")): return LEGACY_VERSION, root
+        return None, None
+
+def _versions(root):
+    folder = os.path.join(root, VERSIONS_FOLDER)
+    names = os.listdir(folder) if os.path.isdir(folder) else []
+    return sorted(n for n in names if n.startswith("v") and n[1:].isdigit())
+
+def new_snapshot(root=FAISS_INDEX_PATH):
+    """(version, staging folder) for the next snapshot; nothing can read it until publish_snapshot()."""
+    versions = _versions(root)
+    version = f"v{int(versions[-1][1:]) + 1 if versions else 1:06d}"
+    staging = os.path.join(root, VERSIONS_FOLDER, version + ".tmp")
+    if os.path.exists(staging): shutil.rmtree(staging)
+    os.makedirs(staging)
+    return version, staging
+
+def publish_snapshot(version, root=FAISS_INDEX_PATH, keep=INDEX_KEEP_VERSIONS):
+    folder = os.path.join(root, VERSIONS_FOLDER, version)
+    os.rename(folder + ".tmp", folder)
+    tmp_path = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+    # The old single-folder layout is superseded once a snapshot is published
+    for name in ("index.faiss", "index.pkl", "index_meta.json", "lexical_index.json", "docstore"):
+        path = os.path.join(root, name)
+        if os.path.isdir(path): shutil.rmtree(path)
+        elif os.path.exists(path): os.remove(path)
+    # Open memory maps survive unlinking, so pruning never breaks a server still on an old version
+    for old in _versions(root)[:-max(keep, 1)]:
+        shutil.rmtree(os.path.join(root, VERSIONS_FOLDER, old), ignore_errors=True)
+
+def snapshot_size(folder):
+    return sum(os.path.getsize(os.path.join(path, f)) for path, _, files in os.walk(folder) for f in files)
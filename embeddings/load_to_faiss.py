@@ -1,57 +1,134 @@
 # embeddings/load_to_faiss.py
-import os, json, sys
+import os, sys, shutil
 import numpy as np
+import faiss
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config import EMBEDDING_MODEL_NAME, FAISS_INDEX_PATH, EMBEDDINGS_FOLDER
-
-MODEL_SUBFOLDER = EMBEDDING_MODEL_NAME.split('/')[-1]
-MODEL_EMBEDDINGS_FOLDER = os.path.join(EMBEDDINGS_FOLDER, MODEL_SUBFOLDER)
-PROCESSED_FILES_TRACKER = os.path.join(MODEL_EMBEDDINGS_FOLDER, "processed_in_faiss.json")
-
-def load_processed_files_tracker():
-    if os.path.exists(PROCESSED_FILES_TRACKER):
-        with open(PROCESSED_FILES_TRACKER, "r", encoding="utf-8") as f:
-            return set(json.load(f))
-    return set()
-
-def save_processed_files_tracker(processed_files):
-    with open(PROCESSED_FILES_TRACKER, "w", encoding="utf-8") as f:
-        json.dump(list(processed_files), f, indent=2)
-
-def prepare_new_data(processed_files):
-    new_files = {f for f in os.listdir(MODEL_EMBEDDINGS_FOLDER) if f.endswith("_embeddings.json")} - processed_files
-    if not new_files: return None, None, None, None
-    texts, embeddings, metadatas = [], [], []
-    for fname in new_files:
-        fpath = os.path.join(MODEL_EMBEDDINGS_FOLDER, fname)
-        try:
-            with open(fpath, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                for item in data:
-                    texts.append(item["content"])
-                    embeddings.append(item["embedding"])
-                    metadatas.append(item["metadata"])
-        except (json.JSONDecodeError, KeyError):
-            pass
-    return texts, embeddings, metadatas, new_files
+from config import FAISS_INDEX_PATH, FAISS_INDEX_TYPE
+from ingestion.manifest import load_manifest, save_manifest, stale_files, mark_done
+from embeddings.embedding_store import read_vectors, read_table
+from embeddings.doc_store import write_docstore, docstore_exists, load_docstore_in_memory
+from embeddings.index_snapshots import current_snapshot, new_snapshot, publish_snapshot
+from rag.lexical_index import LexicalIndex
+from processing.dedup_chunks import chunk_key, load_near_duplicates
+from embeddings.faiss_index import effective_index_type, make_index, train_index, read_index_meta, write_index_meta, needs_rebuild
+
+class PrecomputedEmbeddings(Embeddings):
+    """Placeholder embedding function: the index builder only adds vectors that were already computed."""
+    def embed_documents(self, texts):
+        raise RuntimeError("The FAISS builder does not embed text; run embeddings/create_embeddings.py first.")
+    def embed_query(self, text):
+        raise RuntimeError("The FAISS builder does not embed text; load the index with rag.rag_chain.load_vectorstore().")
+
+def vector_ids(fname, count):
+    return [f"{fname}#{i}" for i in range(count)]
+
+def add_vectors(vectorstore, vectors, texts, metadatas, ids):
+    # Mirrors FAISS.add_embeddings without first copying the vectors into Python lists
+    start = vectorstore.index.ntotal
+    vectorstore.index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    vectorstore.docstore.add({_id: Document(id=_id, page_content=t, metadata=m) for _id, t, m in zip(ids, texts, metadatas)})
+    vectorstore.index_to_docstore_id.update({start + j: _id for j, _id in enumerate(ids)})
+
+def open_vectorstore(manifest, stale):
+    """The saved index when it can be updated in place, or None when it has to be built from the embedding shards."""
+    # An index built before the manifest existed has no per-file ids, and one saved with a pickled
+    # docstore has no columnar store, so either is rebuilt once
+    _, folder = current_snapshot()
+    if folder is None or not docstore_exists(folder) or not any(entry.get("indexed") for entry in manifest.values()): return None
+    modified = any(manifest[f].get("indexed_count") for f in stale)
+    if needs_rebuild(read_index_meta(folder), 0, modified): return None
+    docstore, index_to_docstore_id = load_docstore_in_memory(folder)
+    return FAISS(PrecomputedEmbeddings(), faiss.read_index(os.path.join(folder, "index.faiss")), docstore, index_to_docstore_id)
+
+def remove_file_vectors(vectorstore, fname, entry):
+    if vectorstore is not None and entry.get("indexed_count"):
+        existing_ids = set(vectorstore.index_to_docstore_id.values())
+        old_ids = [i for i in vector_ids(fname, entry["indexed_count"]) if i in existing_ids]
+        if old_ids: vectorstore.delete(old_ids)
+    entry.pop("indexed_count", None)
+
+def index_file(vectorstore, fname, entry, vectors, texts, metadatas, duplicates=None):
+    # Rows that are near-duplicates of a chunk indexed elsewhere are left out (shards written by the
+    # streaming pipeline still contain them)
+    keep = [i for i, m in enumerate(metadatas) if str(m.get("chunk_id")) not in (duplicates or {})]
+    if len(keep) < len(texts):
+        vectors, texts, metadatas = np.asarray(vectors)[keep], [texts[i] for i in keep], [metadatas[i] for i in keep]
+    add_vectors(vectorstore, vectors, texts, metadatas, vector_ids(fname, len(texts)))
+    entry["indexed_count"] = len(texts)
+
+def annotate_sources(documents, near_duplicates):
+    # Canonical chunks list every source their near-duplicates came from
+    for doc in documents:
+        sources = near_duplicates["sources"].get(chunk_key(doc.metadata.get("source"), doc.metadata.get("chunk_id")))
+        if sources: doc.metadata["sources"] = sources
+        else: doc.metadata.pop("sources", None)
+
+def build_from_shards(manifest, sample_size=100_000, seed=0):
+    """Builds (and trains, for IVF types) a fresh index from every embedded shard, without re-embedding anything."""
+    entries = [(fname, entry) for fname, entry in manifest.items() if entry.get("embedded") and entry.get("shard")]
+    shards = [read_vectors(entry["shard"]) for _, entry in entries]
+    for _, entry in entries: entry.pop("indexed_count", None)
+    n_vectors = sum(len(v) for v in shards)
+    if not n_vectors: return None, None
+    index_type = effective_index_type(n_vectors)
+    index = make_index(shards[0].shape[1], n_vectors, index_type)
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        fraction = min(1.0, sample_size / n_vectors)
+        train_index(index, np.concatenate([v[rng.random(len(v)) < fraction] if fraction < 1 else v for v in shards]))
+    vectorstore = FAISS(PrecomputedEmbeddings(), index, InMemoryDocstore(), {})
+    duplicates = load_near_duplicates()["duplicates"]
+    for (fname, entry), vectors in zip(entries, shards):
+        texts, metadatas = read_table(entry["shard"])
+        index_file(vectorstore, fname, entry, vectors, texts, metadatas, duplicates.get(fname))
+    return vectorstore, {"configured": FAISS_INDEX_TYPE, "type": index_type, "built_size": n_vectors}
+
+def save_vectorstore(vectorstore, manifest):
+    """Writes the index as a new snapshot and publishes it; running APIs pick it up without a restart."""
+    _, current = current_snapshot()
+    meta = read_index_meta(current) if vectorstore is not None else None
+    if vectorstore is None or needs_rebuild(meta, vectorstore.index.ntotal, False):
+        vectorstore, meta = build_from_shards(manifest)
+    if vectorstore is None:
+        if os.path.exists(FAISS_INDEX_PATH): shutil.rmtree(FAISS_INDEX_PATH)
+        return
+    # The BM25 index only re-tokenizes chunks it hasn't seen, even after a FAISS rebuild
+    lexical_index = (LexicalIndex.load(current) if current else None) or LexicalIndex()
+    ids = [vectorstore.index_to_docstore_id[i] for i in range(vectorstore.index.ntotal)]
+    documents = [vectorstore.docstore.search(_id) for _id in ids]
+    annotate_sources(documents, load_near_duplicates())
+    lexical_index.sync({_id: doc.page_content for _id, doc in zip(ids, documents)})
+    version, folder = new_snapshot()
+    faiss.write_index(vectorstore.index, os.path.join(folder, "index.faiss"))
+    write_docstore(folder, ids, documents)
+    write_index_meta(folder, meta)
+    lexical_index.save(folder)
+    publish_snapshot(version)
+    print(f"Published index snapshot {version} ({vectorstore.index.ntotal} vectors)")
 
 def main():
-    embeddings_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-    processed_files = load_processed_files_tracker()
-    texts, embeddings, metadatas, new_files = prepare_new_data(processed_files)
-    if not texts: return
-    text_embedding_pairs = list(zip(texts, embeddings))
-    if os.path.exists(FAISS_INDEX_PATH):
-        vectorstore = FAISS.load_local(FAISS_INDEX_PATH, embeddings_model, allow_dangerous_deserialization=True)
-        vectorstore.add_embeddings(text_embedding_pairs, metadatas=metadatas)
-    else:
-        vectorstore = FAISS.from_embeddings(text_embedding_pairs, embeddings_model, metadatas=metadatas)
-    vectorstore.save_local(FAISS_INDEX_PATH)
-    processed_files.update(new_files)
-    save_processed_files_tracker(processed_files)
+    manifest = load_manifest()
+    stale = stale_files(manifest, "indexed")
+    # A changed FAISS_INDEX_TYPE triggers a rebuild even when no document changed
+    _, current = current_snapshot()
+    if not stale and (current is None or not needs_rebuild(read_index_meta(current), 0, False)): return
+    vectorstore = open_vectorstore(manifest, stale)
+    duplicates = load_near_duplicates()["duplicates"]
+    for fname in stale:
+        entry = manifest[fname]
+        if vectorstore is not None:
+            remove_file_vectors(vectorstore, fname, entry)
+            if entry.get("embedded") and entry.get("shard"):
+                texts, metadatas = read_table(entry["shard"])
+                index_file(vectorstore, fname, entry, read_vectors(entry["shard"]), texts, metadatas, duplicates.get(fname))
+        mark_done(manifest, fname, "indexed")
+    save_vectorstore(vectorstore, manifest)
+    save_manifest(manifest)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,62 @@
+# embeddings/model_backend.py
+import os, sys
+from functools import lru_cache
+from langchain_core.embeddings import Embeddings
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_QUANTIZATION_CONFIG, EMBEDDINGS_FOLDER
+
+BACKENDS = ("torch", "onnx", "onnx_int8")
+MODEL_SUBFOLDER = EMBEDDING_MODEL_NAME.split('/')[-1]
+BACKEND_CACHE_FOLDER = os.path.join(EMBEDDINGS_FOLDER, MODEL_SUBFOLDER, "backends")
+
+def encoder_signature(backend=EMBEDDING_BACKEND):
+    """Identifies the vectors a backend produces; stored embeddings from another signature are recomputed."""
+    return EMBEDDING_MODEL_NAME if backend == "torch" else f"{EMBEDDING_MODEL_NAME}:{backend}"
+
+def _export_onnx(backend):
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    export_dir = os.path.join(BACKEND_CACHE_FOLDER, "onnx")
+    if not os.path.exists(os.path.join(export_dir, "onnx", "model.onnx")):
+        SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx").save_pretrained(export_dir)
+    if backend == "onnx":
+        return export_dir, "onnx/model.onnx"
+    file_name = f"onnx/model_qint8_{EMBEDDING_QUANTIZATION_CONFIG}.onnx"
+    if not os.path.exists(os.path.join(export_dir, file_name)):
+        model = SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": "onnx/model.onnx"})
+        export_dynamic_quantized_onnx_model(model, EMBEDDING_QUANTIZATION_CONFIG, export_dir)
+    return export_dir, file_name
+
+@lru_cache(maxsize=None)
+def load_encoder(backend=EMBEDDING_BACKEND):
+    """A SentenceTransformer running on the configured backend; ONNX exports are built once and cached on disk."""
+    from sentence_transformers import SentenceTransformer
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}', expected one of {BACKENDS}.")
+    if backend == "torch":
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+    export_dir, file_name = _export_onnx(backend)
+    return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
+
+@lru_cache(maxsize=None)
+def load_tokenizer():
+    """The embedding model's tokenizer alone (no weights), for measuring text in the tokens the model will see."""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+
+def token_counts(texts):
+    """Tokens per text, excluding the special tokens the model adds to every input."""
+    if not texts: return []
+    return [len(ids) for ids in load_tokenizer()(list(texts), add_special_tokens=False)["input_ids"]]
+
+class EncoderEmbeddings(Embeddings):
+    """LangChain wrapper so queries are embedded by the same backend that embedded the documents."""
+
+    def __init__(self, backend=EMBEDDING_BACKEND):
+        self.encoder = load_encoder(backend)
+
+    def embed_documents(self, texts):
+        return self.encoder.encode(list(texts), batch_size=32, convert_to_numpy=True).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
@@ -0,0 +1,97 @@
+# fake_ollama.py
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Stand-in for `ollama serve` with the endpoints ollama_client.py uses. It answers the exam
+# generator's prompts with numbered questions after a configurable delay, so the generator can
+# be tested and timed without a model. `fail_first` makes the first N requests return 500, to
+# exercise retries.
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            return self._json(200, {"models": [{"name": self.server.model}]})
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path != "/api/generate":
+            return self._json(404, {"error": "not found"})
+        with self.server.lock:
+            self.server.requests += 1
+            fail = self.server.requests <= self.server.fail_first
+        if fail:
+            return self._json(500, {"error": "simulated failure"})
+        tokens = self.server.answer(body.get("prompt", ""))
+        if not body.get("stream", True):
+            time.sleep((self.server.latency_ms + self.server.token_ms * len(tokens)) / 1000)
+            return self._json(200, {"model": body.get("model"), "response": "".join(tokens), "done": True})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.server.latency_ms / 1000)
+        for token in tokens:
+            time.sleep(self.server.token_ms / 1000)
+            self._chunk({"model": body.get("model"), "response": token, "done": False})
+        self._chunk({"model": body.get("model"), "response": "", "done": True, "prompt_eval_count": len(body.get("prompt", "")) // 4, "eval_count": len(tokens)})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, obj):
+        data = json.dumps(obj).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients dropping pooled keep-alive connections is normal
+
+def exam_answer(prompt):
+    """Numbered questions matching the "Create N questions of M marks" line of an exam prompt."""
+    match = re.search(r"Create (\d+) questions of (\d+) marks", prompt)
+    count, marks = (int(match.group(1)), int(match.group(2))) if match else (1, 1)
+    units = re.findall(r"from (UNIT [IVX\d]+)", prompt) or ["the syllabus"]
+    lines = [f"Q{i + 1}. Explain a key topic from {units[i % len(units)]}. ({marks} marks)" for i in range(count)]
+    return [word + " " for word in "\n".join(lines).split(" ")]
+
+def start_fake_ollama(port=0, latency_ms=200, token_ms=2, fail_first=0, model="gemma:2b", answer=exam_answer):
+    """Starts the server on a daemon thread and returns it; its URL is server.url, stop it with server.shutdown()."""
+    server = FakeOllamaServer(("127.0.0.1", port), FakeOllamaHandler)
+    server.latency_ms, server.token_ms, server.fail_first, server.model, server.answer = latency_ms, token_ms, fail_first, model, answer
+    server.requests, server.lock = 0, threading.Lock()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for a local Ollama server.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Delay before the first token.")
+    parser.add_argument("--token-ms", type=float, default=2, help="Delay per token.")
+    parser.add_argument("--fail-first", type=int, default=0, help="Answer the first N requests with HTTP 500.")
+    args = parser.parse_args()
+    server = start_fake_ollama(args.port, args.latency_ms, args.token_ms, args.fail_first)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
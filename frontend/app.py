@@ -2,6 +2,7 @@
 import streamlit as st
 import requests
 import uuid
+import json
 import sys
 import os
 
@@ -11,7 +12,7 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
 # Now this import will work correctly
-from config import API_URL
+from config import API_STREAM_URL
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -42,27 +43,37 @@ if prompt := st.chat_input("Ask me anything about the college..."):
 
     data = {"query": prompt, "session_id": st.session_state.session_id}
 
-    with st.spinner("Thinking..."):
-        try:
-            response = requests.post(API_URL, data=data)
+    def stream_answer(sources):
+        # Parses the API's server-sent events, collecting sources and yielding answer tokens as they arrive
+        with requests.post(API_STREAM_URL, data=data, stream=True, timeout=(5, 300)) as response:
             response.raise_for_status()
-            
-            api_response = response.json()
-            answer = api_response.get("answer", "Sorry, I couldn't get an answer.")
-            sources = api_response.get("sources", [])
-            
-            with st.chat_message("assistant"):
-                st.markdown(answer)
-                if sources:
-                    with st.expander("View Sources"):
-                        for i, source in enumerate(sources):
-                            st.write(f"**Source {i+1}:** {source['metadata'].get('source', 'N/A')}")
-                            st.write(source['content'])
-                            st.divider()
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    payload = json.loads(line[len("data:"):].strip())
+                    if event == "sources":
+                        sources.extend(payload)
+                    elif event == "token":
+                        yield payload
+                    elif event == "error":
+                        raise RuntimeError(payload)
 
-            st.session_state.messages.append({"role": "assistant", "content": answer})
+    try:
+        sources = []
+        with st.chat_message("assistant"):
+            answer = st.write_stream(stream_answer(sources)) or "Sorry, I couldn't get an answer."
+            if sources:
+                with st.expander("View Sources"):
+                    for i, source in enumerate(sources):
+                        st.write(f"**Source {i+1}:** {source['metadata'].get('source', 'N/A')}")
+                        st.write(source['content'])
+                        st.divider()
 
-        except requests.exceptions.RequestException as e:
-            st.error(f"Failed to connect to the API. Please make sure the backend is running. Error: {e}")
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
\ No newline at end of file
+        st.session_state.messages.append({"role": "assistant", "content": answer})
+
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to connect to the API. Please make sure the backend is running. Error: {e}")
+    except Exception as e:
+        st.error(f"An error occurred: {e}")
\ No newline at end of file
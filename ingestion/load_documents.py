@@ -1,26 +1,15 @@
 # ingestion/load_documents.py
-import os, glob, json, re, sys
+import os, json, re, sys, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from PyPDF2 import PdfReader
 import pdfplumber
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 import pytesseract
 import docx
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config import DATA_FOLDER, PROCESSED_DOCS_FOLDER
-
-PROCESSED_FILES_TRACKER = os.path.join(PROCESSED_DOCS_FOLDER, "processed_files.json")
-
-def load_processed_files():
-    if os.path.exists(PROCESSED_FILES_TRACKER):
-        with open(PROCESSED_FILES_TRACKER, "r") as f:
-            return set(json.load(f))
-    return set()
-
-def save_processed_files(processed_set):
-    os.makedirs(PROCESSED_DOCS_FOLDER, exist_ok=True)
-    with open(PROCESSED_FILES_TRACKER, "w") as f:
-        json.dump(list(processed_set), f)
+from config import DATA_FOLDER, PROCESSED_DOCS_FOLDER, INGESTION_WORKERS, OCR_WORKERS, OCR_DPI, OCR_MIN_PAGE_CHARS
+from ingestion.manifest import load_manifest, save_manifest, sync_sources, stale_files, mark_done, invalidate
 
 def save_chunks_to_json(filename, chunks):
     os.makedirs(PROCESSED_DOCS_FOLDER, exist_ok=True)
@@ -28,56 +17,90 @@ def save_chunks_to_json(filename, chunks):
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(chunks, f, ensure_ascii=False, indent=2)
 
+def remove_processed_doc(filename):
+    out_path = os.path.join(PROCESSED_DOCS_FOLDER, filename + ".json")
+    if os.path.exists(out_path): os.remove(out_path)
+
 def clean_text(text):
     text = re.sub(r'[^\x00-\x7F]+', ' ', text)
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
 
+def clean_table(table):
+    # Rows stay on their own lines so the chunker can split a long table between rows
+    rows = (" | ".join(clean_text(" ".join(filter(None, cell.split('\n')))) if cell else '' for cell in row) for row in table)
+    return "\n".join(row for row in rows if row.strip(" |"))
+
 def is_likely_text(text, alpha_ratio=0.5, min_length=10):
     if not text or len(text.strip()) < min_length: return False
     alpha_chars = sum(1 for char in text if char.isalpha())
     if len(text.strip()) > 0 and (alpha_chars / len(text.strip())) < alpha_ratio: return False
     return True
 
+def ocr_pdf_page(file_path, page_number):
+    images = convert_from_path(file_path, dpi=OCR_DPI, first_page=page_number, last_page=page_number)
+    try:
+        return page_number, "".join(pytesseract.image_to_string(img) for img in images)
+    except Exception:
+        return page_number, ""
+    finally:
+        for img in images: img.close()
+
+def ocr_pdf_pages(file_path, page_numbers):
+    if not page_numbers: return []
+    results = []
+    with ThreadPoolExecutor(max_workers=min(OCR_WORKERS, len(page_numbers))) as executor:
+        futures = [executor.submit(ocr_pdf_page, file_path, n) for n in page_numbers]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception:
+                pass
+    return results
+
 def extract_text_from_file(file_path):
     ext = os.path.splitext(file_path)[1].lower()
     chunks = []
     filename = os.path.basename(file_path)
 
     if ext == ".pdf":
-        raw_text_content = ""
+        page_texts, sparse_text = {}, {}
         try:
             with pdfplumber.open(file_path) as pdf:
+                page_count = len(pdf.pages)
                 for i, page in enumerate(pdf.pages, start=1):
-                    tables = page.extract_tables()
-                    for table in tables:
-                        if table:
-                            table_text = "\n".join([" | ".join(filter(None, cell.split('\n')) if cell else '' for cell in row) for row in table])
-                            chunks.append({"content": clean_text(table_text), "metadata": {"source": filename, "page": i, "type": "table"}})
-                    page_text = page.extract_text(x_tolerance=2, y_tolerance=2)
-                    if page_text:
-                        raw_text_content += page_text + "\n\n"
-            if not chunks and not raw_text_content.strip():
-                images = convert_from_path(file_path)
-                for i, img in enumerate(images, start=1):
-                    ocr_text = pytesseract.image_to_string(img)
-                    if ocr_text.strip():
-                         chunks.append({"content": clean_text(ocr_text), "metadata": {"source": filename, "page": i, "type": "ocr"}})
+                    text_area = page
+                    for table in page.find_tables():
+                        rows = table.extract()
+                        table_text = clean_table(rows) if rows else ""
+                        if table_text:
+                            chunks.append({"content": table_text, "metadata": {"source": filename, "page": i, "type": "table"}})
+                            text_area = text_area.outside_bbox(table.bbox, strict=False) # Its text is already in the table chunk
+                    page_text = text_area.extract_text(x_tolerance=2, y_tolerance=2) or ""
+                    # Tables read from the text layer mean the page is not a scan, however little text is left
+                    if len(page_text.strip()) >= OCR_MIN_PAGE_CHARS or text_area is not page:
+                        page_texts[i] = page_text
+                    elif page_text.strip():
+                        sparse_text[i] = page_text
+                    page.flush_cache()
         except Exception:
             try:
-                images = convert_from_path(file_path)
-                for i, img in enumerate(images, start=1):
-                    ocr_text = pytesseract.image_to_string(img)
-                    if ocr_text.strip():
-                         chunks.append({"content": clean_text(ocr_text), "metadata": {"source": filename, "page": i, "type": "ocr"}})
+                page_count = pdfinfo_from_path(file_path)["Pages"]
             except Exception:
-                pass
-        if raw_text_content:
-            paragraphs = raw_text_content.split('\n\n')
-            for para in paragraphs:
+                page_count = 0
+        # Only pages with an empty or sparse text layer are rasterized, one page at a time
+        ocr_results = ocr_pdf_pages(file_path, [i for i in range(1, page_count + 1) if i not in page_texts])
+        for i, ocr_text in ocr_results:
+            if ocr_text.strip():
+                chunks.append({"content": clean_text(ocr_text), "metadata": {"source": filename, "page": i, "type": "ocr"}})
+            elif i in sparse_text:
+                page_texts[i] = sparse_text[i]
+        # Paragraphs keep their page number so the chunker merges only within a page and citations can name it
+        for i in sorted(page_texts):
+            for para in page_texts[i].split('\n\n'):
                 cleaned_para = clean_text(para)
                 if is_likely_text(cleaned_para):
-                    chunks.append({"content": cleaned_para, "metadata": {"source": filename, "type": "text"}})
+                    chunks.append({"content": cleaned_para, "metadata": {"source": filename, "page": i, "type": "text"}})
     elif ext == ".docx":
         try:
             doc = docx.Document(file_path)
@@ -96,20 +119,47 @@ def extract_text_from_file(file_path):
             pass
     return chunks
 
-def load_new_documents():
-    processed_files = load_processed_files()
-    new_files_set = set()
-    files_found = glob.glob(os.path.join(DATA_FOLDER, "*"))
-    for file_path in files_found:
-        filename = os.path.basename(file_path)
-        if filename in processed_files: continue
-        chunks = extract_text_from_file(file_path)
-        if chunks:
-            save_chunks_to_json(filename, chunks)
-            new_files_set.add(filename)
-    if new_files_set:
-        processed_files.update(new_files_set)
-        save_processed_files(processed_files)
+def _extract_worker(file_path):
+    """(filename, extracted entries, seconds spent extracting), timed inside the worker process."""
+    start = time.perf_counter()
+    chunks = extract_text_from_file(file_path)
+    return os.path.basename(file_path), chunks, time.perf_counter() - start
+
+def load_new_documents(workers=INGESTION_WORKERS, reprocess=False):
+    manifest = sync_sources(load_manifest(), DATA_FOLDER)
+    if reprocess: invalidate(manifest, "extracted")
+    stale = stale_files(manifest, "extracted")
+    files_found = [os.path.join(DATA_FOLDER, f) for f in stale if manifest[f].get("hash")]
+    for filename in stale:
+        if not manifest[filename].get("hash"):
+            remove_processed_doc(filename)
+            mark_done(manifest, filename, "extracted")
+    save_manifest(manifest)
+    if not files_found: return
+
+    def on_done(filename, chunks, seconds=0.0):
+        # Persist progress per file so an interrupted batch keeps its finished work
+        if chunks: save_chunks_to_json(filename, chunks)
+        else: remove_processed_doc(filename)
+        mark_done(manifest, filename, "extracted")
+        save_manifest(manifest)
+
+    if workers <= 1 or len(files_found) == 1:
+        for file_path in files_found:
+            on_done(*_extract_worker(file_path))
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(files_found))) as executor:
+        futures = {executor.submit(_extract_worker, p): p for p in files_found}
+        for future in as_completed(futures):
+            try:
+                on_done(*future.result())
+            except Exception:
+                pass
 
 if __name__ == "__main__":
-    load_new_documents()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Extract text from new or modified files in the data folder.")
+    parser.add_argument("--workers", type=int, default=INGESTION_WORKERS, help="Number of extraction processes (1 = sequential).")
+    parser.add_argument("--reprocess", action="store_true", help="Re-extract every file (after changing extraction); later stages follow.")
+    args = parser.parse_args()
+    load_new_documents(workers=args.workers, reprocess=args.reprocess)
\ No newline at end of file
@@ -0,0 +1,68 @@
+# ingestion/manifest.py
+import os, glob, json, hashlib, sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import MANIFEST_PATH
+
+# Every source file maps to its content hash plus the hash each pipeline stage last processed.
+# A stage is stale for a file when its recorded hash differs from the stage before it, which
+# covers new, modified (new hash) and deleted (hash is None) sources alike.
+STAGES = ["extracted", "chunked", "deduped", "embedded", "indexed"]
+
+def file_hash(file_path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest():
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def sync_sources(manifest, folder):
+    seen = set()
+    for file_path in glob.glob(os.path.join(folder, "*")):
+        if not os.path.isfile(file_path): continue
+        filename = os.path.basename(file_path)
+        seen.add(filename)
+        stat = os.stat(file_path)
+        entry = manifest.setdefault(filename, {})
+        # Skip re-hashing files whose size and mtime are unchanged
+        if entry.get("hash") and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime_ns: continue
+        entry.update(hash=file_hash(file_path), size=stat.st_size, mtime=stat.st_mtime_ns)
+    for filename in [f for f in manifest if f not in seen]:
+        manifest[filename]["hash"] = None
+        if not any(manifest[filename].get(s) for s in STAGES):
+            del manifest[filename]
+    return manifest
+
+def upstream_hash(entry, stage):
+    i = STAGES.index(stage)
+    return entry.get("hash") if i == 0 else entry.get(STAGES[i - 1])
+
+def stale_files(manifest, stage):
+    return [filename for filename, entry in manifest.items() if entry.get(stage) != upstream_hash(entry, stage)]
+
+def mark_done(manifest, filename, stage):
+    entry = manifest[filename]
+    entry[stage] = upstream_hash(entry, stage)
+    # A deleted source is forgotten once every stage has cleaned up after it
+    if entry.get("hash") is None and not any(entry.get(s) for s in STAGES):
+        del manifest[filename]
+
+def invalidate(manifest, stage, fnames=None):
+    """Marks `stage` and every later stage stale for `fnames` (default: all present files), e.g. after chunking settings change."""
+    for fname in manifest if fnames is None else fnames:
+        entry = manifest[fname]
+        if entry.get("hash"):
+            for s in STAGES[STAGES.index(stage):]: entry[s] = None
@@ -1,10 +1,19 @@
+import os
+import re
+import json
+import random
+import hashlib
+import tempfile
+import threading
 import pdfplumber
 import pytesseract
 from PIL import Image
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 import textwrap
+from config import SYLLABUS_PATH, SYLLABUS_CACHE_FOLDER
+from ollama_client import get_client
 
 # -------------------------
 # 1. Load PDF (Text + OCR)
@@ -31,10 +40,104 @@ def clean_text(text):
             cleaned.append(line)
     return " ".join(cleaned)
 
+# -------------------------
+# 1b. Syllabus Cache (extract once per PDF)
+# -------------------------
+SYLLABUS_CACHE_VERSION = 1  # Bump when load_pdf / clean_text / split_units change their output
+UNIT_HEADING = re.compile(r"\b(?:UNIT|Unit|MODULE|Module)[\s:.\-–]*([IVX]+|\d+)\b")
+# Course outcomes, text books and references follow the last unit and are not examinable
+SYLLABUS_TAIL = re.compile(r"\b(?:TOTAL\s*:?\s*\d+\s*(?:PERIODS|HOURS)|TEXT\s*BOOKS?|REFERENCE\s*BOOKS?|REFERENCES|COURSE OUTCOMES|OUTCOMES)\b")
+ROMAN = {"I": 1, "V": 5, "X": 10}
+
+def unit_number(numeral):
+    if numeral.isdigit():
+        return int(numeral)
+    total = 0
+    for ch, nxt in zip(numeral, numeral[1:] + " "):
+        value = ROMAN[ch]
+        total += -value if ROMAN.get(nxt, 0) > value else value
+    return total
+
+def split_units(syllabus_text):
+    """[{"title", "text"}] for UNIT I, UNIT II, ...; the whole syllabus as one unit if it has no unit headings."""
+    headings, expected = [], 1
+    for match in UNIT_HEADING.finditer(syllabus_text):
+        # Only the next unit in sequence counts, so "(Unit II)" in an outcomes list is not a heading
+        if unit_number(match.group(1)) == expected:
+            headings.append(match)
+            expected += 1
+    if not headings:
+        return [{"title": "Syllabus", "text": syllabus_text.strip()}]
+    units = []
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(syllabus_text)
+        body = syllabus_text[match.start():end]
+        if i + 1 == len(headings):
+            tail = SYLLABUS_TAIL.search(body, match.end() - match.start())
+            body = body[:tail.start()] if tail else body
+        units.append({"title": f"UNIT {match.group(1).upper()}", "text": body.strip()})
+    return units
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+_syllabus_locks, _syllabus_locks_guard = {}, threading.Lock()
+
+def _read_cached_syllabus(cache_path):
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("version") == SYLLABUS_CACHE_VERSION:
+            return cached
+    return None
+
+def load_syllabus(pdf_path=SYLLABUS_PATH, cache_folder=SYLLABUS_CACHE_FOLDER):
+    """Cleaned syllabus text and its units, extracted (with OCR) only the first time a PDF's content is seen."""
+    content_hash = file_hash(pdf_path)
+    cache_path = os.path.join(cache_folder, f"{content_hash}.json")
+    cached = _read_cached_syllabus(cache_path)
+    if cached:
+        return cached
+    with _syllabus_locks_guard:
+        lock = _syllabus_locks.setdefault(content_hash, threading.Lock())
+    # Concurrent jobs on a new syllabus wait for one extraction instead of each running OCR
+    with lock:
+        cached = _read_cached_syllabus(cache_path)
+        if cached:
+            return cached
+        syllabus_text = clean_text(load_pdf(pdf_path))
+        syllabus = {"version": SYLLABUS_CACHE_VERSION, "hash": content_hash, "source": os.path.basename(pdf_path),
+                    "text": syllabus_text, "units": split_units(syllabus_text)}
+        os.makedirs(cache_folder, exist_ok=True)
+        # A temporary file of its own per writer, so other processes writing the same entry don't collide
+        fd, tmp_path = tempfile.mkstemp(dir=cache_folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(syllabus, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+    return syllabus
+
+def section_syllabus(units, count, start=0):
+    """Only the units a section draws its `count` questions from, each with how many questions it gets."""
+    per_unit = [0] * len(units)
+    for i in range(count):
+        per_unit[(start + i) % len(units)] += 1
+    if len(units) == 1:
+        return units[0]["text"]
+    return "\n\n".join(f"{unit['text']}\n(Set {n} question{'s' if n > 1 else ''} from {unit['title']}.)"
+                       for unit, n in zip(units, per_unit) if n)
+
 # -------------------------
 # 2. Generate Questions
 # -------------------------
-def generate_questions(section_name, syllabus_text, count, marks, difficulty="mixed"):
+def generate_questions(section_name, syllabus_text, count, marks, difficulty="mixed", client=None, on_token=None):
     prompt = f"""
 You are an expert exam paper setter.
 
@@ -43,16 +146,12 @@ Syllabus:
 
 Task:
 Create {count} questions of {marks} marks each for {section_name}.
-Cover all units fairly and do not repeat topics.
+Difficulty level: {difficulty}.
+Only use the syllabus above, follow the number of questions given for each unit and do not repeat topics.
 Use exam style numbering: Q1, Q2, etc.
 Each question must end with "({marks} marks)".
 """
-    result = subprocess.run(
-        ["ollama", "run", "gemma:2b"],
-        input=prompt.encode("utf-8"),
-        capture_output=True
-    )
-    return result.stdout.decode("utf-8")
+    return (client or get_client()).generate(prompt, on_token=on_token)
 
 # -------------------------
 # 3. Save to PDF
@@ -79,14 +178,29 @@ def save_to_pdf(filename, content):
 # -------------------------
 # 4. Generate Exam Paper (API Use)
 # -------------------------
-def generate_exam_paper(difficulty="easy"):
-    syllabus_path = "data/Syllabus.pdf"
-    raw_text = load_pdf(syllabus_path)
-    syllabus_text = clean_text(raw_text)
-
-    secA = generate_questions("Section A", syllabus_text, 10, 2, difficulty)
-    secB = generate_questions("Section B", syllabus_text, 5, 13, difficulty)
-    secC = generate_questions("Section C", syllabus_text, 1, 15, difficulty)
+def generate_exam_paper(difficulty="easy", syllabus_path=SYLLABUS_PATH, output_path="Question_Paper.pdf", on_progress=None):
+    """Writes a paper to output_path; on_progress(stage, fraction) is called as the work advances."""
+    report = on_progress or (lambda stage, fraction: None)
+    report("syllabus", 0.0)
+    units = load_syllabus(syllabus_path)["units"]
+    report("sections", 0.1)
+    done, lock = [0], threading.Lock()
+
+    def section_done(future):
+        with lock:
+            done[0] += 1
+            report("sections", 0.1 + 0.8 * done[0] / 3)
+
+    # The sections are independent, so the paper takes as long as the slowest one
+    # (given a server that answers requests in parallel, e.g. OLLAMA_NUM_PARALLEL=3)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        secA = pool.submit(generate_questions, "Section A", section_syllabus(units, 10), 10, 2, difficulty)
+        secB = pool.submit(generate_questions, "Section B", section_syllabus(units, 5), 5, 13, difficulty)
+        # A single long-answer question only needs one unit, picked so papers vary
+        secC = pool.submit(generate_questions, "Section C", section_syllabus(units, 1, random.randrange(len(units))), 1, 15, difficulty)
+        for future in (secA, secB, secC):
+            future.add_done_callback(section_done)
+        secA, secB, secC = secA.result(), secB.result(), secC.result()
 
     final_paper = f"""\
 QUESTION PAPER
@@ -105,5 +219,6 @@ SECTION C (15 marks × 1 = 15 marks)
 {secC}
 """
 
-    save_to_pdf("Question_Paper.pdf", final_paper)
-    return "Question_Paper.pdf"
+    report("pdf", 0.9)
+    save_to_pdf(output_path, final_paper)
+    return output_path
@@ -0,0 +1,80 @@
+# ollama_client.py
+import json
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from config import (OLLAMA_URL, OLLAMA_MODEL, OLLAMA_KEEP_ALIVE, OLLAMA_POOL_SIZE, OLLAMA_CONNECT_TIMEOUT,
+                    OLLAMA_SECTION_TIMEOUT, OLLAMA_RETRIES)
+
+class OllamaError(RuntimeError):
+    pass
+
+class OllamaClient:
+    """Streams completions from a local Ollama-compatible server over pooled keep-alive connections.
+
+    One client is shared by every request in the process (see get_client), so the exam generator
+    neither spawns `ollama run` per section nor reloads the model: the server keeps it warm for
+    OLLAMA_KEEP_ALIVE and sections run in parallel over the pool.
+    """
+
+    def __init__(self, base_url=OLLAMA_URL, model=OLLAMA_MODEL, timeout=OLLAMA_SECTION_TIMEOUT, retries=OLLAMA_RETRIES, pool_size=OLLAMA_POOL_SIZE):
+        self.base_url, self.model, self.timeout, self.retries = base_url.rstrip("/"), model, timeout, retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def stream(self, prompt, options=None):
+        """Yields pieces of the completion as the server produces them; raises TimeoutError past self.timeout."""
+        deadline = time.monotonic() + self.timeout
+        payload = {"model": self.model, "prompt": prompt, "stream": True, "keep_alive": OLLAMA_KEEP_ALIVE, "options": options or {}}
+        # The read timeout bounds the wait for each line; the deadline bounds the whole answer
+        with self.session.post(f"{self.base_url}/api/generate", json=payload, stream=True, timeout=(OLLAMA_CONNECT_TIMEOUT, self.timeout)) as response:
+            if response.status_code >= 500:
+                raise requests.HTTPError(f"{response.status_code} from model server: {response.text[:200]}", response=response)
+            if response.status_code != 200:
+                raise OllamaError(f"Model server rejected the request ({response.status_code}): {response.text[:200]}")
+            for line in response.iter_lines():
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"No complete answer within {self.timeout}s")
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise OllamaError(chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    return
+        raise requests.ConnectionError("Model server closed the stream before it was done")
+
+    def generate(self, prompt, options=None, on_token=None):
+        """Full completion text, retrying a timed-out or dropped attempt from the start up to self.retries times.
+
+        `on_token` sees every piece as it arrives, including those of an attempt that is later retried.
+        """
+        for attempt in range(self.retries + 1):
+            parts = []
+            try:
+                for piece in self.stream(prompt, options):
+                    parts.append(piece)
+                    if on_token: on_token(piece)
+                return "".join(parts)
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError, requests.exceptions.ChunkedEncodingError, TimeoutError) as e:
+                if attempt == self.retries:
+                    raise OllamaError(f"{self.model} at {self.base_url} failed after {attempt + 1} attempt(s): {e}") from e
+                time.sleep(min(2 ** attempt, 8) * 0.5)
+
+    def close(self):
+        self.session.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
@@ -0,0 +1,82 @@
+# paper_jobs.py
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import SYLLABUS_PATH, PAPER_OUTPUT_FOLDER, PAPER_JOB_WORKERS, PAPER_MAX_PENDING, PAPER_JOB_RETENTION_SECONDS
+from main import file_hash, generate_exam_paper
+
+class QueueFull(RuntimeError):
+    pass
+
+class SyllabusUnavailable(RuntimeError):
+    pass
+
+class PaperJobs:
+    """Question papers generated on a bounded thread pool, each job writing its own PDF.
+
+    A request for a syllabus version and difficulty that already has a queued or running job
+    gets that job back instead of starting another one.
+    """
+
+    def __init__(self, workers=PAPER_JOB_WORKERS, max_pending=PAPER_MAX_PENDING, output_folder=PAPER_OUTPUT_FOLDER,
+                 retention_seconds=PAPER_JOB_RETENTION_SECONDS, generate=generate_exam_paper):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="paper-job")
+        self.max_pending, self.output_folder, self.retention_seconds, self.generate = max_pending, output_folder, retention_seconds, generate
+        self.lock = threading.Lock()
+        self.jobs = {} # job id -> status dict
+        self.active = {} # (syllabus hash, difficulty) -> id of its queued or running job
+
+    def submit(self, difficulty="easy", syllabus_path=SYLLABUS_PATH):
+        """(job, deduplicated): the new job, or the one already generating this paper."""
+        try:
+            key = (file_hash(syllabus_path), difficulty)
+        except OSError as e:
+            raise SyllabusUnavailable(f"cannot read the syllabus {os.path.basename(syllabus_path)}: {e.strerror or e}") from e
+        with self.lock:
+            self._expire()
+            if key in self.active:
+                return dict(self.jobs[self.active[key]]), True
+            if len(self.active) >= self.max_pending:
+                raise QueueFull(f"{len(self.active)} papers are already queued or being generated")
+            job_id = uuid.uuid4().hex
+            job = self.jobs[job_id] = {"id": job_id, "status": "queued", "stage": "queued", "progress": 0.0, "difficulty": difficulty,
+                                       "syllabus_hash": key[0], "created": time.time(), "finished": None, "error": None, "file": None}
+            self.active[key] = job_id
+        self.pool.submit(self._run, job_id, key, syllabus_path)
+        return dict(job), False
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def _run(self, job_id, key, syllabus_path):
+        self._update(job_id, status="running")
+        path = os.path.join(self.output_folder, f"{job_id}.pdf")
+        try:
+            os.makedirs(self.output_folder, exist_ok=True)
+            self.generate(key[1], syllabus_path, path, lambda stage, fraction: self._update(job_id, stage=stage, progress=round(fraction, 3)))
+            self._update(job_id, status="done", stage="done", progress=1.0, file=path, finished=time.time())
+        except Exception as e:
+            self._update(job_id, status="failed", stage="failed", error=f"{type(e).__name__}: {e}", finished=time.time())
+        finally:
+            with self.lock:
+                self.active.pop(key, None)
+
+    def _expire(self):
+        # Called with the lock held; finished jobs are only dropped once nobody can still be polling them
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [j for j, job in self.jobs.items() if job["finished"] and job["finished"] < cutoff]:
+            job = self.jobs.pop(job_id)
+            if job["file"] and os.path.exists(job["file"]):
+                os.remove(job["file"])
+
+    def get(self, job_id):
+        with self.lock:
+            self._expire() # Polling also clears old papers, so an idle server doesn't keep them forever
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,203 @@
+# pipeline/stream_pipeline.py
+import os, sys, time, queue, threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import DATA_FOLDER, INGESTION_WORKERS, PIPELINE_QUEUE_SIZE, PIPELINE_ENCODE_BATCH, PIPELINE_WRITE_INTERMEDIATE, DEDUP_ENABLED
+from ingestion.manifest import load_manifest, save_manifest, sync_sources, stale_files, mark_done, upstream_hash, invalidate, STAGES
+from ingestion.load_documents import _extract_worker, save_chunks_to_json, remove_processed_doc
+from processing.chunks_documents import chunk_document, save_chunks, remove_chunks
+from processing.dedup_chunks import save_signatures, remove_signatures, refresh_near_duplicates, load_near_duplicates
+from embeddings.create_embeddings import get_model, invalidate_stale_embeddings
+from embeddings.model_backend import encoder_signature
+from embeddings.embedding_cache import EmbeddingCache, encode_with_cache
+from embeddings.embedding_store import shard_name, write_shard, read_vectors, read_table, remove_shard
+from embeddings.load_to_faiss import open_vectorstore, remove_file_vectors, index_file, save_vectorstore
+from embeddings.faiss_index import read_index_meta, needs_rebuild
+from embeddings.index_snapshots import current_snapshot
+
+_DONE = object()
+
+class StageStats:
+    def __init__(self, name):
+        self.name, self.files, self.items, self.busy = name, 0, 0, 0.0
+
+    def report(self, wall):
+        rate = self.items / self.busy if self.busy else 0.0
+        return f"{self.name:<8} files={self.files:<5} items={self.items:<7} busy={self.busy:7.1f}s ({100 * self.busy / wall if wall else 0:5.1f}% of wall) {rate:9.1f} items/s"
+
+def _run_stage(fn, inbox, outbox, errors):
+    try:
+        while (item := inbox.get()) is not _DONE:
+            fn(item)
+    except BaseException as e:
+        errors.append(e)
+        # Keep draining so upstream producers never block on a full queue
+        while inbox.get() is not _DONE: pass
+    finally:
+        if outbox is not None: outbox.put(_DONE)
+
+def run_pipeline(workers=INGESTION_WORKERS, write_intermediate=PIPELINE_WRITE_INTERMEDIATE):
+    manifest = sync_sources(load_manifest(), DATA_FOLDER)
+    invalidate_stale_embeddings(manifest)
+    stale = set().union(*(stale_files(manifest, stage) for stage in STAGES))
+    if not stale: return
+    vectorstore = open_vectorstore(manifest, stale)
+    duplicates = load_near_duplicates()["duplicates"]
+
+    # Deleted sources and files that only still need indexing never enter the stream
+    for fname in [f for f in stale if not manifest[f].get("hash")]:
+        entry = manifest[fname]
+        remove_processed_doc(fname); remove_chunks(fname); remove_signatures(fname)
+        if entry.get("shard"): remove_shard(entry.pop("shard"))
+        remove_file_vectors(vectorstore, fname, entry)
+        for stage in STAGES: mark_done(manifest, fname, stage)
+        stale.discard(fname)
+    for fname in [f for f in stale if all(manifest[f].get(s) == upstream_hash(manifest[f], s) for s in STAGES[:-1])]:
+        entry = manifest[fname]
+        remove_file_vectors(vectorstore, fname, entry)
+        if vectorstore is not None and entry.get("shard"):
+            texts, metadatas = read_table(entry["shard"])
+            index_file(vectorstore, fname, entry, read_vectors(entry["shard"]), texts, metadatas, duplicates.get(fname))
+        stale.discard(fname)
+
+    stats = {name: StageStats(name) for name in ("extract", "chunk", "encode", "index")}
+    extracted, chunked, encoded = (queue.Queue(maxsize=PIPELINE_QUEUE_SIZE) for _ in range(3))
+    errors, cache = [], EmbeddingCache()
+    start = time.perf_counter()
+
+    def extract():
+        # At most 2x workers files are in flight, so finished documents can't pile up in memory
+        pending, files = {}, [os.path.join(DATA_FOLDER, f) for f in sorted(stale)]
+        try:
+            with ProcessPoolExecutor(max_workers=max(1, min(workers, len(files) or 1))) as executor:
+                while files or pending:
+                    while files and len(pending) < 2 * workers:
+                        file_path = files.pop(0)
+                        pending[executor.submit(_extract_worker, file_path)] = file_path
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        file_path = pending.pop(future)
+                        try:
+                            fname, entries, seconds = future.result()
+                        except Exception as e:
+                            print(f"[WARN] Extraction failed for {os.path.basename(file_path)}: {e}")
+                            continue
+                        stats["extract"].files += 1
+                        stats["extract"].items += len(entries)
+                        # Time spent extracting, not waiting on a full queue; summed over the worker processes
+                        stats["extract"].busy += seconds
+                        extracted.put((fname, entries))
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            extracted.put(_DONE)
+
+    def chunk(item):
+        t0 = time.perf_counter()
+        fname, entries = item
+        if write_intermediate and entries: save_chunks_to_json(fname, entries)
+        else: remove_processed_doc(fname)
+        chunks = [c for c in (chunk_document(entries) if entries else []) if c["content"].strip()]
+        if write_intermediate and chunks: save_chunks(fname, chunks)
+        else: remove_chunks(fname)
+        if DEDUP_ENABLED and chunks: save_signatures(fname, chunks)
+        else: remove_signatures(fname)
+        stats["chunk"].files += 1
+        stats["chunk"].items += len(chunks)
+        stats["chunk"].busy += time.perf_counter() - t0
+        chunked.put((fname, chunks))
+
+    def encode_batch(batch):
+        t0 = time.perf_counter()
+        texts = [c["content"] for _, chunks in batch for c in chunks]
+        vectors = encode_with_cache(texts, cache, get_model) if texts else np.empty((0, 0), dtype=np.float32)
+        offset = 0
+        for fname, chunks in batch:
+            encoded.put((fname, chunks, vectors[offset:offset + len(chunks)]))
+            offset += len(chunks)
+        stats["encode"].files += len(batch)
+        stats["encode"].items += len(texts)
+        stats["encode"].busy += time.perf_counter() - t0
+
+    def encode():
+        # Groups small documents so the encoder sees full batches instead of one call per file
+        batch, size = [], 0
+        try:
+            while (item := chunked.get()) is not _DONE:
+                batch.append(item); size += len(item[1])
+                if size >= PIPELINE_ENCODE_BATCH or chunked.empty():
+                    encode_batch(batch)
+                    batch, size = [], 0
+            if batch: encode_batch(batch)
+        except BaseException as e:
+            errors.append(e)
+            while chunked.get() is not _DONE: pass
+        finally:
+            encoded.put(_DONE)
+
+    threads = [threading.Thread(target=extract, daemon=True),
+               threading.Thread(target=_run_stage, args=(chunk, extracted, chunked, errors), daemon=True),
+               threading.Thread(target=encode, daemon=True)]
+    for t in threads: t.start()
+    while (item := encoded.get()) is not _DONE:
+        t0 = time.perf_counter()
+        fname, chunks, vectors = item
+        entry = manifest[fname]
+        if entry.get("shard"): remove_shard(entry["shard"])
+        entry["shard"] = None
+        remove_file_vectors(vectorstore, fname, entry)
+        if chunks:
+            texts, metadatas = [c["content"] for c in chunks], [c["metadata"] for c in chunks]
+            entry["shard"] = write_shard(shard_name(fname, entry["hash"]), vectors, texts, metadatas)
+            entry["encoder"] = encoder_signature()
+            # Without an updatable index, save_vectorstore builds one from the shards at the end
+            if vectorstore is not None: index_file(vectorstore, fname, entry, vectors, texts, metadatas)
+        for stage in STAGES[:-1]: mark_done(manifest, fname, stage)
+        save_manifest(manifest)
+        stats["index"].files += 1
+        stats["index"].items += len(chunks)
+        stats["index"].busy += time.perf_counter() - t0
+    for t in threads: t.join()
+
+    # Near-duplicates are only known once every chunk has a signature, so streamed files were embedded
+    # and indexed whole; now their duplicates (and those of sources whose clusters changed) are dropped
+    if DEDUP_ENABLED and not errors:
+        missing, old_duplicates, changed = [], duplicates, refresh_near_duplicates(manifest)
+        duplicates = load_near_duplicates()["duplicates"]
+        affected = sorted(f for f in changed | (stale & set(duplicates)) if f in manifest)
+        _, current = current_snapshot()
+        if affected and vectorstore is not None and needs_rebuild(read_index_meta(current), 0, True): vectorstore = None
+        for fname in affected:
+            entry = manifest[fname]
+            texts, metadatas = read_table(entry["shard"]) if entry.get("shard") else ([], [])
+            # A shard from the staged pipeline has no rows for chunks that were duplicates when it was embedded
+            needed = set(old_duplicates.get(fname, {})) - set(duplicates.get(fname, {}))
+            if needed - {str(m.get("chunk_id")) for m in metadatas}: missing.append(fname)
+            if vectorstore is not None and entry.get("shard"):
+                remove_file_vectors(vectorstore, fname, entry)
+                index_file(vectorstore, fname, entry, read_vectors(entry["shard"]), texts, metadatas, duplicates.get(fname))
+        invalidate(manifest, "embedded", missing) # Embedded again on the next run
+        if missing: print(f"{len(missing)} sources now hold canonical chunks they were embedded without; run the pipeline again to add them")
+        save_manifest(manifest)
+
+    # "indexed" is only recorded once the updated index is safely on disk
+    save_vectorstore(vectorstore, manifest)
+    for fname in stale_files(manifest, "indexed"): mark_done(manifest, fname, "indexed")
+    save_manifest(manifest)
+    cache.close()
+
+    wall = time.perf_counter() - start
+    print(f"Pipeline finished in {wall:.1f}s (embedding cache: {cache.hits} hits, {cache.misses} misses)")
+    for s in stats.values(): print("  " + s.report(wall))
+    if errors: raise errors[0]
+    return stats
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Stream new or modified documents through extraction, chunking, embedding and indexing.")
+    parser.add_argument("--workers", type=int, default=INGESTION_WORKERS, help="Number of extraction processes.")
+    parser.add_argument("--debug-output", action="store_true", default=PIPELINE_WRITE_INTERMEDIATE, help="Also write processed_docs/ and chunks/ JSON files.")
+    args = parser.parse_args()
+    run_pipeline(workers=args.workers, write_intermediate=args.debug_output)
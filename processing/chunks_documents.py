@@ -1,22 +1,11 @@
 # processing/chunks_documents.py
-import os, glob, json, sys
+import os, json, sys
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config import PROCESSED_DOCS_FOLDER, CHUNKS_FOLDER, CHUNK_SIZE, CHUNK_OVERLAP, MIN_CHUNK_SIZE
-
-PROCESSED_CHUNKED = os.path.join(CHUNKS_FOLDER, "processed_chunked.json")
-
-def load_processed_chunked():
-    if os.path.exists(PROCESSED_CHUNKED):
-        with open(PROCESSED_CHUNKED, "r") as f:
-            return set(json.load(f))
-    return set()
-
-def save_processed_chunked(processed_set):
-    os.makedirs(CHUNKS_FOLDER, exist_ok=True)
-    with open(PROCESSED_CHUNKED, "w") as f:
-        json.dump(list(processed_set), f)
+from config import PROCESSED_DOCS_FOLDER, CHUNKS_FOLDER, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from embeddings.model_backend import token_counts
+from ingestion.manifest import load_manifest, save_manifest, stale_files, mark_done, invalidate
 
 def save_chunks(filename, chunks):
     os.makedirs(CHUNKS_FOLDER, exist_ok=True)
@@ -24,39 +13,92 @@ def save_chunks(filename, chunks):
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(chunks, f, ensure_ascii=False, indent=2)
 
-def chunk_document(doc_json):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, length_function=len)
-    final_chunks = []
-    for entry in doc_json:
-        content = entry.get("content", "").strip()
-        metadata = entry.get("metadata", {})
-        if not content: continue
+def remove_chunks(filename):
+    out_path = os.path.join(CHUNKS_FOLDER, filename + "_chunks.json")
+    if os.path.exists(out_path): os.remove(out_path)
+
+def _split_table(content, count, budget):
+    """Pieces of a table under the token budget, cut only between rows; each piece repeats the header row."""
+    rows = content.split("\n")
+    header, body = rows[0], rows[1:]
+    row_tokens = count(rows)
+    pieces, current, current_tokens = [], [], row_tokens[0]
+    for row, n in zip(body, row_tokens[1:]):
+        if current and current_tokens + n > budget:
+            pieces.append("\n".join([header] + current))
+            current, current_tokens = [], row_tokens[0]
+        current.append(row)
+        current_tokens += n
+    if current or not pieces: pieces.append("\n".join([header] + current))
+    return pieces
+
+def chunk_document(doc_json, count=token_counts, budget=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
+    """Chunks of at most `budget` embedding-model tokens.
+
+    Adjacent paragraphs with the same source, page and type are merged up to the budget, so short
+    DOCX/PDF paragraphs no longer become vectors of their own. A paragraph over the budget is split
+    with `overlap` tokens of overlap, and tables are cut only between rows. Nothing is dropped for
+    being short, and nothing is longer than the model's input window.
+    """
+    length = lambda text: count([text])[0]
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=budget, chunk_overlap=overlap, length_function=length)
+    entries = [entry for entry in doc_json if entry.get("content", "").strip()]
+    tokens = count([entry["content"].strip() for entry in entries])
+    pieces, group, group_tokens, group_key = [], [], 0, None
+
+    def flush():
+        if group: pieces.append(("\n\n".join(group), group_meta))
+        group.clear()
+
+    for entry, n in zip(entries, tokens):
+        content, metadata = entry["content"].strip(), entry.get("metadata", {})
         if metadata.get("type") == "table":
-            final_chunks.append({"content": content, "metadata": {**metadata, "chunk_id": 1}})
+            flush()
+            parts = [content] if n <= budget else _split_table(content, count, budget)
+            pieces += [(part, metadata) for part in parts]
+            continue
+        key = (metadata.get("source"), metadata.get("page"), metadata.get("type"))
+        # The separator between merged paragraphs costs about one token
+        if group and (key != group_key or group_tokens + n + 1 > budget): flush()
+        if n > budget:
+            pieces += [(part, metadata) for part in text_splitter.split_text(content)]
             continue
-        splits = text_splitter.split_text(content)
-        for i, chunk in enumerate(splits, start=1):
-            if len(chunk) >= MIN_CHUNK_SIZE:
-                final_chunks.append({"content": chunk, "metadata": {**metadata, "chunk_id": i}})
+        if not group: group_meta, group_tokens, group_key = metadata, 0, key
+        group.append(content)
+        group_tokens += n + 1
+    flush()
+
+    # Tokens can merge across a joined boundary, so every chunk is measured once more as a whole
+    final_chunks = []
+    for (content, metadata), n in zip(pieces, count([content for content, _ in pieces])):
+        for part in ([content] if n <= budget else text_splitter.split_text(content)):
+            final_chunks.append({"content": part, "metadata": {**metadata, "chunk_id": len(final_chunks) + 1}})
     return final_chunks
 
+def main(rechunk=False):
+    manifest = load_manifest()
+    if rechunk: invalidate(manifest, "chunked")
+    for fname in stale_files(manifest, "chunked"):
+        file_path = os.path.join(PROCESSED_DOCS_FOLDER, fname + ".json")
+        chunks = []
+        if manifest[fname].get("extracted") and os.path.exists(file_path):
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    doc_json = json.load(f)
+                if not isinstance(doc_json, list) or not all(isinstance(entry, dict) and 'content' in entry for entry in doc_json):
+                    raise ValueError("expected a list of {'content', 'metadata'} entries")
+                chunks = chunk_document(doc_json)
+            except Exception as e:
+                # The old chunks are dropped all the same, so outdated content stops being served;
+                # run ingestion.load_documents --reprocess to extract the file again
+                print(f"[WARN] Chunking failed for {fname}: {e}")
+        if chunks: save_chunks(fname, chunks)
+        else: remove_chunks(fname)
+        mark_done(manifest, fname, "chunked")
+        save_manifest(manifest)
+
 if __name__ == "__main__":
-    processed_chunked = load_processed_chunked()
-    new_chunked = set()
-    files = glob.glob(os.path.join(PROCESSED_DOCS_FOLDER, "*.json"))
-    for file_path in files:
-        fname = os.path.basename(file_path).replace(".json", "")
-        if fname in processed_chunked: continue
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                doc_json = json.load(f)
-            if not isinstance(doc_json, list) or not all(isinstance(entry, dict) and 'content' in entry for entry in doc_json): continue
-            chunks = chunk_document(doc_json)
-            if chunks:
-                save_chunks(fname, chunks)
-                new_chunked.add(fname)
-        except Exception:
-            pass
-    if new_chunked:
-        processed_chunked.update(new_chunked)
-        save_processed_chunked(processed_chunked)
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Chunk new or modified extracted documents.")
+    parser.add_argument("--rechunk", action="store_true", help="Re-chunk every document (after changing the chunk settings); later stages follow.")
+    main(rechunk=parser.parse_args().rechunk)
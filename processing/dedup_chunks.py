@@ -0,0 +1,171 @@
+# processing/dedup_chunks.py
+import os, json, sys, zlib, hashlib
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import CHUNKS_FOLDER, NEAR_DUPLICATES_FOLDER, DEDUP_ENABLED, DEDUP_THRESHOLD, DEDUP_SHINGLE_WORDS, DEDUP_NUM_PERM, DEDUP_BANDS
+from ingestion.manifest import load_manifest, save_manifest, stale_files, mark_done, invalidate
+
+# Near-duplicate chunks across the whole corpus, found with MinHash + LSH. Each source keeps its
+# chunks' signatures in NEAR_DUPLICATES_FOLDER, so only new or modified sources are hashed; the
+# clustering itself runs over every signature at once (256 bytes per chunk) with numpy. The result,
+# duplicates.json, maps every non-canonical chunk to its canonical one and every canonical chunk to
+# the sources it appears in. Embedding skips the duplicates and indexing adds the "sources" list.
+
+MAP_PATH = os.path.join(NEAR_DUPLICATES_FOLDER, "duplicates.json")
+_EMPTY = np.uint32(0xFFFFFFFF)
+_rng = np.random.default_rng(20240601) # Fixed, so signatures stay comparable across runs
+_SHINGLE_MULT = _rng.integers(1, 2**63, size=DEDUP_SHINGLE_WORDS, dtype=np.uint64) | np.uint64(1)
+_BAND_MULT = _rng.integers(1, 2**63, size=DEDUP_NUM_PERM // DEDUP_BANDS, dtype=np.uint64) | np.uint64(1)
+
+def chunk_key(fname, chunk_id):
+    return f"{fname}#{chunk_id}"
+
+def _mix(h):
+    # splitmix64 finalizer: spreads the shingle hashes over all 64 bits
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+def minhash_signatures(texts, num_perm=DEDUP_NUM_PERM, shingle_words=DEDUP_SHINGLE_WORDS):
+    """One-permutation MinHash of word shingles: [len(texts), num_perm] uint32, all 0xFFFFFFFF for texts without words."""
+    bits = num_perm.bit_length() - 1
+    rows, hashes = [], []
+    with np.errstate(over="ignore"):
+        for row, text in enumerate(texts):
+            words = np.array([zlib.crc32(w.encode("utf-8")) for w in text.lower().split()], dtype=np.uint64)
+            if not len(words): continue
+            k = min(shingle_words, len(words))
+            shingles = sum(words[j:len(words) - k + 1 + j] * _SHINGLE_MULT[j] for j in range(k))
+            hashes.append(_mix(shingles))
+            rows.append(np.full(len(shingles), row, dtype=np.int64))
+        signatures = np.full((len(texts), num_perm), _EMPTY, dtype=np.uint32)
+        if not hashes: return signatures
+        h = np.concatenate(hashes)
+        # The top bits pick a bin and the low 32 bits are the value kept per bin
+        np.minimum.at(signatures, (np.concatenate(rows), (h >> np.uint64(64 - bits)).astype(np.int64)), (h & np.uint64(0xFFFFFFFF)).astype(np.uint32))
+    # Short chunks leave bins empty; borrow the next filled bin's value so they still compare fairly
+    original, empty = signatures.copy(), signatures == _EMPTY
+    empty[(original == _EMPTY).all(axis=1)] = False
+    for step in range(1, num_perm):
+        if not empty.any(): break
+        source = np.roll(original, -step, axis=1)
+        fill = empty & (source != _EMPTY)
+        signatures[fill] = source[fill] ^ np.uint32(step * 0x9E3779B1 & 0xFFFFFFFF)
+        empty &= ~fill
+    return signatures
+
+def near_duplicate_roots(signatures, threshold=DEDUP_THRESHOLD, bands=DEDUP_BANDS):
+    """For every row, the lowest row it is a near-duplicate of (itself if none).
+
+    Rows that agree on all values of any LSH band become candidates, and a candidate is accepted
+    when the fraction of equal signature values (the Jaccard estimate) reaches `threshold`.
+    """
+    n, num_perm = signatures.shape
+    per_band = num_perm // bands
+    blank = (signatures == _EMPTY).all(axis=1)
+    pairs = []
+    with np.errstate(over="ignore"):
+        for b in range(bands):
+            keys = (signatures[:, b * per_band:(b + 1) * per_band].astype(np.uint64) * _BAND_MULT).sum(axis=1)
+            order = np.argsort(keys, kind="stable") # Ties keep row order, so a bucket's first row is its lowest
+            starts = np.r_[True, keys[order][1:] != keys[order][:-1]]
+            first = order[np.maximum.accumulate(np.where(starts, np.arange(n), 0))]
+            rows, reps = order[~starts], first[~starts]
+            keep = ~blank[rows] & ((signatures[rows] == signatures[reps]).mean(axis=1) >= threshold)
+            pairs.append(np.stack([rows[keep], reps[keep]], axis=1))
+    parent = np.arange(n)
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    # The same pair usually turns up in several bands; union each one once
+    for row, rep in np.unique(np.concatenate(pairs), axis=0).tolist() if pairs else []:
+        a, b = find(row), find(rep)
+        if a != b: parent[max(a, b)] = min(a, b)
+    return np.array([find(i) for i in range(n)], dtype=np.int64)
+
+def signature_path(fname):
+    return os.path.join(NEAR_DUPLICATES_FOLDER, hashlib.sha256(fname.encode("utf-8")).hexdigest()[:16] + ".npz")
+
+def save_signatures(fname, chunks):
+    os.makedirs(NEAR_DUPLICATES_FOLDER, exist_ok=True)
+    path = signature_path(fname)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, chunk_ids=np.array([str(c["metadata"].get("chunk_id", i)) for i, c in enumerate(chunks)]),
+                 signatures=minhash_signatures([c["content"] for c in chunks]))
+    os.replace(path + ".tmp", path)
+
+def remove_signatures(fname):
+    if os.path.exists(signature_path(fname)): os.remove(signature_path(fname))
+
+def load_near_duplicates():
+    """{"duplicates": {fname: {chunk_id: canonical key}}, "sources": {canonical key: [fname, ...]}}; empty when disabled."""
+    if not DEDUP_ENABLED or not os.path.exists(MAP_PATH): return {"duplicates": {}, "sources": {}}
+    with open(MAP_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def refresh_near_duplicates(manifest):
+    """Clusters every source's signatures, saves the duplicate map and returns the sources whose duplicates changed."""
+    old = load_near_duplicates()
+    fnames, chunk_ids, signatures = [], [], []
+    for fname in sorted(f for f, entry in manifest.items() if entry.get("hash")):
+        if not os.path.exists(signature_path(fname)): continue
+        with np.load(signature_path(fname)) as data:
+            fnames += [fname] * len(data["chunk_ids"])
+            chunk_ids += data["chunk_ids"].tolist()
+            signatures.append(data["signatures"])
+    roots = near_duplicate_roots(np.concatenate(signatures)) if signatures else np.zeros(0, dtype=np.int64)
+    duplicates, sources = {}, {}
+    for row, root in enumerate(roots.tolist()):
+        if root == row: continue
+        canonical = chunk_key(fnames[root], chunk_ids[root])
+        duplicates.setdefault(fnames[row], {})[chunk_ids[row]] = canonical
+        cluster = sources.setdefault(canonical, [fnames[root]])
+        if fnames[row] not in cluster: cluster.append(fnames[row])
+    n_dup = sum(len(d) for d in duplicates.values())
+    stats = {"chunks": len(roots), "duplicates": n_dup, "clusters": len(set(v for d in duplicates.values() for v in d.values())),
+             "multi_source_clusters": sum(len(s) > 1 for s in sources.values())}
+    os.makedirs(NEAR_DUPLICATES_FOLDER, exist_ok=True)
+    with open(MAP_PATH + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"duplicates": duplicates, "sources": sources, "stats": stats}, f, ensure_ascii=False)
+    os.replace(MAP_PATH + ".tmp", MAP_PATH)
+    print(f"Near-duplicates: {n_dup} of {len(roots)} chunks ({100 * n_dup / max(len(roots), 1):.1f}%) collapse into "
+          f"{stats['clusters']} canonical chunks, {stats['multi_source_clusters']} of them shared across sources")
+    return {f for f in set(old["duplicates"]) | set(duplicates) if old["duplicates"].get(f) != duplicates.get(f)}
+
+def main():
+    manifest = load_manifest()
+    stale = stale_files(manifest, "deduped")
+    if not DEDUP_ENABLED:
+        # Every chunk is kept: the stage still has to pass new and modified files on to embedding
+        for fname in stale:
+            remove_signatures(fname)
+            mark_done(manifest, fname, "deduped")
+        if os.path.exists(MAP_PATH):
+            # Sources embedded without their duplicate chunks are embedded again in full
+            with open(MAP_PATH, "r", encoding="utf-8") as f:
+                invalidate(manifest, "embedded", [fname for fname in json.load(f)["duplicates"] if fname in manifest])
+            os.remove(MAP_PATH)
+        save_manifest(manifest)
+        return
+    if not stale and os.path.exists(MAP_PATH): return
+    # Sources deduped while the step was disabled have no signatures yet
+    unsigned = [f for f, entry in manifest.items() if entry.get("chunked") and f not in stale and not os.path.exists(signature_path(f))]
+    for fname in stale + unsigned:
+        entry = manifest[fname]
+        chunk_path = os.path.join(CHUNKS_FOLDER, fname + "_chunks.json")
+        if entry.get("chunked") and os.path.exists(chunk_path):
+            with open(chunk_path, "r", encoding="utf-8") as f:
+                save_signatures(fname, [c for c in json.load(f) if c["content"].strip()])
+        else:
+            remove_signatures(fname)
+        mark_done(manifest, fname, "deduped")
+    # A source whose set of duplicate chunks changed is re-embedded (cache hits for unchanged text) and re-indexed
+    changed = [f for f in refresh_near_duplicates(manifest) if f in manifest and f not in stale]
+    invalidate(manifest, "embedded", changed)
+    save_manifest(manifest)
+
+if __name__ == "__main__":
+    main()
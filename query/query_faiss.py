@@ -1,16 +1,13 @@
 # query/query_faiss.py
 
-import os
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import os, sys
 
-# ---------- CONFIG ----------
-MODEL_NAME = "intfloat/multilingual-e5-large"
-MODEL_SUBFOLDER = MODEL_NAME.split('/')[-1]
-
-# The correct, updated path to your FAISS index
-FAISS_INDEX_PATH = os.path.join("../embeddings", MODEL_SUBFOLDER, "faiss_index")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import FAISS_INDEX_PATH
+from embeddings.model_backend import EncoderEmbeddings
+from rag.rag_chain import load_vectorstore
 
+# ---------- CONFIG ----------
 # Number of search results to return
 K = 5
 
@@ -56,13 +53,10 @@ def main():
     # Load the embedding model and the FAISS index
     print("[INFO] Loading embedding model and FAISS index...")
     try:
-        embeddings_model = HuggingFaceEmbeddings(model_name=MODEL_NAME)
-        vectorstore = FAISS.load_local(
-            FAISS_INDEX_PATH, 
-            embeddings_model,
-            # This is required for loading FAISS indexes created with older LangChain versions
-            allow_dangerous_deserialization=True 
-        )
+        # Queries go through the same EMBEDDING_BACKEND (torch, onnx or onnx_int8) that embedded the documents
+        embeddings_model = EncoderEmbeddings()
+        # Memory-maps the index and its columnar docstore; no pickle is deserialized
+        vectorstore = load_vectorstore(embeddings_model)
         print("✅ Index loaded successfully.")
     except Exception as e:
         print(f"[ERROR] Failed to load the FAISS index: {e}")
@@ -0,0 +1,125 @@
+# rag/answer_cache.py
+import os, sys, time, asyncio, threading
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES
+from embeddings.embedding_cache import normalize_text
+from rag.question_rewriter import needs_rewrite
+
+class AnswerCache:
+    """Answers to standalone questions, found again by the cosine similarity of the question embedding.
+
+    Entries belong to the index version being served and are dropped by reset() when another version
+    takes over, or after the TTL. Requests still running on any other version bypass the cache.
+    Identical questions that arrive while the first one is still being answered wait for that answer
+    instead of starting their own retrieval and LLM call.
+    """
+
+    def __init__(self, embeddings_model, version=None, threshold=ANSWER_CACHE_THRESHOLD, ttl_seconds=ANSWER_CACHE_TTL_SECONDS, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.embeddings_model, self.threshold, self.ttl_seconds, self.max_entries = embeddings_model, threshold, ttl_seconds, max_entries
+        self.lock = threading.Lock()
+        self.version = version
+        self.vectors = None # Unit vectors with spare capacity; row i belongs to entries[i]
+        self.entries = [] # {"question", "response", "created", "seconds"}
+        self.inflight = {} # (version, normalized question) -> asyncio.Future of the response
+        self.hits = self.misses = self.skipped = self.merged = 0
+        self.saved_seconds = 0.0
+
+    def cacheable(self, question, chat_history):
+        # A follow-up ("and its fees?") means something different in every conversation
+        if chat_history and needs_rewrite(question):
+            self.skipped += 1
+            return False
+        return True
+
+    def reset(self, version):
+        """Drops every entry; called when `version` becomes the served index."""
+        with self.lock:
+            self.version, self.vectors, self.entries = version, None, []
+
+    def _drop_oldest(self, count):
+        self.entries = self.entries[count:]
+        self.vectors[:len(self.entries)] = self.vectors[count:count + len(self.entries)]
+
+    def _nearest(self, vector, version):
+        with self.lock:
+            if version != self.version: return None # A request that started before (or after) a reload
+            now = time.time()
+            # Entries are in insertion order, so expired ones form a prefix
+            expired = next((i for i, e in enumerate(self.entries) if now - e["created"] <= self.ttl_seconds), len(self.entries))
+            if expired: self._drop_oldest(expired)
+            if not self.entries: return None
+            scores = self.vectors[:len(self.entries)] @ vector
+            best = int(np.argmax(scores))
+            return self.entries[best] if scores[best] >= self.threshold else None
+
+    def _store(self, vector, question, response, version, seconds):
+        entry = {"question": question, "response": {"answer": response["answer"], "context": response.get("context", [])}, "created": time.time(), "seconds": seconds}
+        with self.lock:
+            if version != self.version: return # Answered from an index that is no longer served
+            if len(self.entries) >= self.max_entries: self._drop_oldest(max(1, self.max_entries // 10))
+            n = len(self.entries)
+            if self.vectors is None or n == len(self.vectors):
+                grown = np.empty((min(max(2 * n, 64), self.max_entries), len(vector)), dtype=np.float32)
+                if n: grown[:n] = self.vectors[:n]
+                self.vectors = grown
+            self.vectors[n] = vector
+            self.entries.append(entry)
+
+    async def lookup(self, question, version):
+        """(vector, cached response or None); the vector is reused by store() on a miss."""
+        start = time.perf_counter()
+        vector = np.asarray(await self.embeddings_model.aembed_query(question), dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        entry = self._nearest(vector, version)
+        if entry is None: return vector, None
+        self.hits += 1
+        self.saved_seconds += max(0.0, entry["seconds"] - (time.perf_counter() - start))
+        return vector, entry["response"]
+
+    def lead(self, question, version):
+        """(future, is_leader): the leader computes the answer; everyone else awaits the same future."""
+        key = (version, normalize_text(question).lower())
+        future = self.inflight.get(key)
+        if future is not None:
+            self.merged += 1
+            return future, False
+        self.misses += 1
+        future = self.inflight[key] = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda f: self.inflight.pop(key, None) if self.inflight.get(key) is f else None)
+        # Nobody may be waiting when the leader fails; retrieving the exception keeps asyncio quiet
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return future, True
+
+    def finish(self, future, vector, question, version, response=None, seconds=0.0, error=None):
+        if future.done(): return
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)): future.cancel() # The leader's client went away
+        elif error is not None: future.set_exception(error)
+        if error is not None: return
+        self._store(vector, question, response, version, seconds)
+        future.set_result(response)
+
+    async def aget(self, question, version, compute):
+        """Cached, merged or freshly computed response for a standalone question; `compute` is an async callable."""
+        vector, response = await self.lookup(question, version)
+        if response is not None: return response
+        future, is_leader = self.lead(question, version)
+        if not is_leader:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The leader's client went away; answer this request on its own
+                if not future.cancelled(): raise
+                return await compute()
+        start = time.perf_counter()
+        try:
+            response = await compute()
+        except BaseException as e:
+            self.finish(future, vector, question, version, error=e)
+            raise
+        self.finish(future, vector, question, version, response, time.perf_counter() - start)
+        return response
+
+    def __len__(self):
+        return len(self.entries)
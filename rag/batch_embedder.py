@@ -0,0 +1,98 @@
+# rag/batch_embedder.py
+import os, sys, time, queue, asyncio, threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from langchain_core.embeddings import Embeddings
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import EMBED_BATCH_MAX_SIZE, EMBED_BATCH_WINDOW_MS
+
+class RecentQueryEmbeddings(Embeddings):
+    """Remembers the last few query vectors, so the answer cache and the retriever embed a question only once."""
+
+    def __init__(self, base, size=256):
+        self.base, self.size = base, size
+        self.recent, self.lock = OrderedDict(), threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.base, name) # Batching statistics and the like stay visible
+
+    def _get(self, text):
+        with self.lock:
+            vector = self.recent.get(text)
+            if vector is not None: self.recent.move_to_end(text)
+            return vector
+
+    def _put(self, text, vector):
+        with self.lock:
+            self.recent[text] = vector
+            while len(self.recent) > self.size: self.recent.popitem(last=False)
+        return vector
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        vector = self._get(text)
+        return vector if vector is not None else self._put(text, self.base.embed_query(text))
+
+    async def aembed_query(self, text):
+        vector = self._get(text)
+        return vector if vector is not None else self._put(text, await self.base.aembed_query(text))
+
+class BatchingEmbeddings(Embeddings):
+    """Wraps an embedding model so concurrent embed_query calls share one encode batch.
+
+    A batch closes after EMBED_BATCH_WINDOW_MS or at EMBED_BATCH_MAX_SIZE queries; while a batch is
+    being encoded new queries queue up, so batches grow with load instead of running one by one.
+    """
+
+    def __init__(self, base, max_batch_size=EMBED_BATCH_MAX_SIZE, window_ms=EMBED_BATCH_WINDOW_MS):
+        self.base, self.max_batch_size, self.window = base, max_batch_size, window_ms / 1000
+        self.requests = queue.Queue()
+        self.batches = self.queries = 0
+        threading.Thread(target=self._worker, name="query-embedder", daemon=True).start()
+
+    def submit(self, text):
+        future = Future()
+        self.requests.put((text, future))
+        return future
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.submit(text).result()
+
+    async def aembed_query(self, text):
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _worker(self):
+        while True:
+            try:
+                self._run_batch()
+            except Exception:
+                pass # The thread must outlive any one batch, or every later query would wait forever
+
+    def _run_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        # Queries cancelled while queued (e.g. a client that disconnected) are not encoded
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch: return
+        try:
+            # embed_query is embed_documents([text])[0], so batching doesn't change the vectors
+            vectors = self.base.embed_documents([text for text, _ in batch])
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done(): future.set_result(vector)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done(): future.set_exception(e)
+        self.batches += 1
+        self.queries += len(batch)
@@ -0,0 +1,103 @@
+# rag/embedding_server.py
+import os, sys, time, queue, asyncio, secrets, threading
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import EMBEDDING_SERVER_SOCKET, EMBEDDING_SERVER_AUTHKEY, EMBEDDING_SERVER_KEY_FILE
+
+# One process per host owns the embedding model; API workers send it texts over a Unix socket and
+# get float32 vectors back. Queries from every worker meet in the same BatchingEmbeddings queue.
+
+def write_key_file(path=EMBEDDING_SERVER_KEY_FILE):
+    """A fresh random secret, readable by this user only, for clients running without EMBEDDING_SERVER_AUTHKEY."""
+    authkey = secrets.token_hex(32)
+    if os.path.exists(path): os.remove(path) # Recreated, so an old file's permissions never carry over
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+        f.write(authkey)
+    return authkey
+
+def read_key_file(path=EMBEDDING_SERVER_KEY_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+def _handle(conn, embeddings_model):
+    with conn:
+        while True:
+            try:
+                kind, payload = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if kind == "query": vectors = [embeddings_model.embed_query(payload)]
+                elif kind == "documents": vectors = embeddings_model.embed_documents(payload)
+                else: raise ValueError(f"Unknown request '{kind}'")
+                conn.send(("ok", np.asarray(vectors, dtype=np.float32)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+
+def serve(address=EMBEDDING_SERVER_SOCKET, authkey=EMBEDDING_SERVER_AUTHKEY):
+    from rag.rag_chain import load_embeddings_model
+    embeddings_model = load_embeddings_model(warm_up=True, remote=False)
+    if os.path.exists(address): os.remove(address) # Left behind by a server that was killed
+    authkey = authkey or write_key_file()
+    with Listener(address, family="AF_UNIX", authkey=authkey.encode("utf-8")) as listener:
+        os.chmod(address, 0o600)
+        print(f"Embedding server listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"[WARN] Rejected embedding client: {e}")
+                continue
+            threading.Thread(target=_handle, args=(conn, embeddings_model), daemon=True).start()
+
+class RemoteEmbeddings(Embeddings):
+    """Embeddings served by serve(); each thread borrows its own connection from a small pool."""
+
+    def __init__(self, address=EMBEDDING_SERVER_SOCKET, authkey=EMBEDDING_SERVER_AUTHKEY, connect_timeout=300):
+        self.address, self.authkey, self.connect_timeout = address, authkey, connect_timeout
+        self.pool = queue.LifoQueue()
+
+    def _connect(self):
+        # The server may still be loading the model when the API workers start
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                # Without a configured secret, use the one the server wrote when it started
+                authkey = self.authkey or read_key_file()
+                return Client(self.address, family="AF_UNIX", authkey=authkey.encode("utf-8"))
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline: raise
+                time.sleep(0.5)
+
+    def _request(self, kind, payload):
+        for attempt in range(2):
+            try:
+                conn = self.pool.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                conn.send((kind, payload))
+                status, result = conn.recv()
+            except (EOFError, OSError):
+                # A restarted server drops old connections; reconnect once
+                conn.close()
+                if attempt: raise
+                continue
+            self.pool.put(conn)
+            if status != "ok": raise RuntimeError(f"Embedding server error: {result}")
+            return result
+
+    def embed_documents(self, texts):
+        return self._request("documents", list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self._request("query", text)[0].tolist()
+
+    async def aembed_query(self, text):
+        return await asyncio.to_thread(self.embed_query, text)
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,51 @@
+# rag/fake_llm.py
+import os, sys, time, asyncio
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import FAKE_LLM_LATENCY_MS, FAKE_LLM_TOKEN_MS
+
+class FakeChatModel(BaseChatModel):
+    """Offline stand-in for the Gemini model: waits `latency_ms` before the first token, then `token_ms` per
+    token, and answers with the opening words of the prompt's last message. Used by benchmarks and load tests."""
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    token_ms: float = FAKE_LLM_TOKEN_MS
+    answer_tokens: int = 24
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _tokens(self, messages):
+        words = str(messages[-1].content).split()[:self.answer_tokens] if messages else []
+        return [w + " " for w in words] or ["I don't know."]
+
+    def _result(self, messages, tokens):
+        # Rough usage numbers (4 characters per token) so token metrics have something to count
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        usage = {"input_tokens": input_tokens, "output_tokens": len(tokens), "total_tokens": input_tokens + len(tokens)}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens).strip(), usage_metadata=usage))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        time.sleep((self.latency_ms + self.token_ms * len(tokens)) / 1000)
+        return self._result(messages, tokens)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        await asyncio.sleep((self.latency_ms + self.token_ms * len(tokens)) / 1000)
+        return self._result(messages, tokens)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        for token in self._tokens(messages):
+            time.sleep(self.token_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency_ms / 1000)
+        for token in self._tokens(messages):
+            await asyncio.sleep(self.token_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,130 @@
+# rag/lexical_index.py
+import os, sys, re, json, math, heapq, hashlib
+from collections import Counter
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import BM25_K1, BM25_B, HYBRID_CANDIDATES, RRF_K, K
+from rag.metrics import stage
+
+LEXICAL_INDEX_FILE = "lexical_index.json"
+
+def fingerprint(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+def tokenize(text):
+    # \w keeps course codes ("CS3401") and form numbers whole and works for non-Latin scripts
+    return re.findall(r"\w+", text.lower())
+
+class LexicalIndex:
+    """In-process BM25 inverted index over the same chunk ids as the FAISS docstore."""
+
+    def __init__(self, doc_terms=None, fingerprints=None):
+        self.doc_terms = {} # doc_id -> {term: tf}
+        self.doc_lens = {}
+        self.fingerprints = {} # doc_id -> hash of the text it was built from
+        self.postings = {} # term -> {doc_id: tf}
+        self.total_len = 0
+        for doc_id, terms in (doc_terms or {}).items():
+            self._add_terms(doc_id, terms, (fingerprints or {}).get(doc_id))
+
+    def _add_terms(self, doc_id, terms, sig):
+        self.doc_terms[doc_id] = terms
+        self.fingerprints[doc_id] = sig
+        self.doc_lens[doc_id] = sum(terms.values())
+        self.total_len += self.doc_lens[doc_id]
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+    def add(self, doc_id, text):
+        if doc_id in self.doc_terms: self.remove(doc_id)
+        self._add_terms(doc_id, dict(Counter(tokenize(text))), fingerprint(text))
+
+    def remove(self, doc_id):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None: return
+        self.total_len -= self.doc_lens.pop(doc_id)
+        self.fingerprints.pop(doc_id, None)
+        for term in terms:
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs: del self.postings[term]
+
+    def sync(self, texts_by_id):
+        """Brings the index in line with `texts_by_id`, tokenizing only documents that are new or whose text changed."""
+        for doc_id in [d for d in self.doc_terms if d not in texts_by_id]:
+            self.remove(doc_id)
+        for doc_id, text in texts_by_id.items():
+            if self.fingerprints.get(doc_id) != fingerprint(text): self.add(doc_id, text)
+
+    def search(self, query, k):
+        n_docs = len(self.doc_terms)
+        if not n_docs: return []
+        avg_len = self.total_len / n_docs
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs: continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lens[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save(self, folder):
+        tmp_path = os.path.join(folder, LEXICAL_INDEX_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"docs": self.doc_terms, "fingerprints": self.fingerprints}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, os.path.join(folder, LEXICAL_INDEX_FILE))
+
+    @classmethod
+    def load(cls, folder):
+        path = os.path.join(folder, LEXICAL_INDEX_FILE)
+        if not os.path.exists(path): return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["docs"], data["fingerprints"])
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return [key for key, _ in heapq.nlargest(k, scores.items(), key=lambda item: item[1])]
+
+class HybridRetriever(BaseRetriever):
+    """Dense FAISS results, merged with BM25 results by reciprocal rank fusion when a lexical index is given."""
+    vectorstore: object
+    lexical_index: object = None
+    k: int = K
+    candidates: int = HYBRID_CANDIDATES
+
+    def _fuse(self, query, dense_docs):
+        if self.lexical_index is None: return dense_docs[:self.k]
+        with stage("bm25_search"):
+            docs = {doc.id or doc.page_content: doc for doc in dense_docs}
+            lexical_ids = [doc_id for doc_id, _ in self.lexical_index.search(query, self.candidates)]
+            for doc_id in lexical_ids:
+                if doc_id not in docs:
+                    doc = self.vectorstore.docstore.search(doc_id)
+                    if isinstance(doc, Document): docs[doc_id] = doc
+        with stage("fusion"):
+            dense_ids = [doc.id or doc.page_content for doc in dense_docs]
+            return [docs[key] for key in reciprocal_rank_fusion([dense_ids, [i for i in lexical_ids if i in docs]], self.k)]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun):
+        # Embedding and search run separately so each gets its own timing
+        with stage("embed_query"):
+            vector = self.vectorstore.embedding_function.embed_query(query)
+        with stage("faiss_search"):
+            dense_docs = self.vectorstore.similarity_search_by_vector(vector, k=self.candidates if self.lexical_index is not None else self.k)
+        return self._fuse(query, dense_docs)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager):
+        with stage("embed_query"):
+            vector = await self.vectorstore.embedding_function.aembed_query(query)
+        with stage("faiss_search"):
+            dense_docs = await self.vectorstore.asimilarity_search_by_vector(vector, k=self.candidates if self.lexical_index is not None else self.k)
+        return self._fuse(query, dense_docs)
@@ -1,10 +1,108 @@
 # rag/memory_buffer.py
-from langchain.memory import ConversationBufferMemory
-from langchain_core.chat_history import BaseChatMessageHistory
+import os, sys, json, time, sqlite3, threading
+from collections import OrderedDict
+from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage, message_to_dict, messages_from_dict
 
-store = {}
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import SESSION_BACKEND, SESSION_DB_PATH, SESSION_MAX_SESSIONS, SESSION_TTL_SECONDS, SESSION_MAX_MESSAGES, HISTORY_MAX_TOKENS
+
+class BoundedChatMessageHistory(InMemoryChatMessageHistory):
+    def add_message(self, message: BaseMessage) -> None:
+        self.messages.append(message)
+        del self.messages[:-SESSION_MAX_MESSAGES]
+
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    def __init__(self, store, session_id):
+        self.store, self.session_id = store, session_id
+
+    @property
+    def messages(self):
+        with self.store.lock:
+            rows = self.store.conn.execute("SELECT message FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?", (self.session_id, SESSION_MAX_MESSAGES)).fetchall()
+        return messages_from_dict([json.loads(row[0]) for row in reversed(rows)])
+
+    def add_messages(self, messages):
+        with self.store.lock:
+            self.store.conn.executemany("INSERT INTO messages (session_id, message) VALUES (?, ?)", [(self.session_id, json.dumps(message_to_dict(m), ensure_ascii=False)) for m in messages])
+            self.store.conn.execute("DELETE FROM messages WHERE session_id = ? AND id NOT IN (SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)", (self.session_id, self.session_id, SESSION_MAX_MESSAGES))
+            self.store.conn.commit()
+
+    def clear(self):
+        with self.store.lock:
+            self.store.conn.execute("DELETE FROM messages WHERE session_id = ?", (self.session_id,))
+            self.store.conn.commit()
+
+class SessionStore:
+    """Chat histories with LRU and idle-TTL eviction, kept in memory or in a SQLite file shared by workers."""
+
+    def __init__(self, backend=SESSION_BACKEND, max_sessions=SESSION_MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS, db_path=SESSION_DB_PATH):
+        self.backend, self.max_sessions, self.ttl_seconds = backend, max_sessions, ttl_seconds
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict() # session_id -> (history, last_seen), least recently used first
+        self.last_sweep = 0.0
+        if backend == "sqlite":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, message TEXT NOT NULL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id)")
+            self.conn.commit()
+        elif backend != "memory":
+            raise ValueError(f"Unknown SESSION_BACKEND '{backend}', expected 'memory' or 'sqlite'.")
+
+    def get(self, session_id):
+        now = time.time()
+        if self.backend == "sqlite":
+            self._sweep_sqlite(now)
+            with self.lock:
+                self.conn.execute("INSERT INTO sessions (session_id, last_seen) VALUES (?, ?) ON CONFLICT(session_id) DO UPDATE SET last_seen = excluded.last_seen", (session_id, now))
+                self.conn.commit()
+            return SQLiteChatMessageHistory(self, session_id)
+        with self.lock:
+            entry = self.sessions.pop(session_id, None)
+            history = entry[0] if entry and now - entry[1] <= self.ttl_seconds else BoundedChatMessageHistory()
+            # Least recently used sessions sit at the front: drop expired ones and anything over the cap
+            while self.sessions and (len(self.sessions) >= self.max_sessions or now - next(iter(self.sessions.values()))[1] > self.ttl_seconds):
+                self.sessions.popitem(last=False)
+            self.sessions[session_id] = (history, now)
+            return history
+
+    def _sweep_sqlite(self, now):
+        # Expiry runs at most once a minute so the hot path stays a single upsert
+        if now - self.last_sweep < 60: return
+        self.last_sweep = now
+        with self.lock:
+            cutoff = self.conn.execute("SELECT last_seen FROM sessions ORDER BY last_seen DESC LIMIT 1 OFFSET ?", (self.max_sessions - 1,)).fetchone()
+            cutoff = max(now - self.ttl_seconds, cutoff[0] if cutoff else 0)
+            self.conn.execute("DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE last_seen < ?)", (cutoff,))
+            self.conn.execute("DELETE FROM sessions WHERE last_seen < ?", (cutoff,))
+            self.conn.commit()
+
+    def __len__(self):
+        if self.backend == "sqlite":
+            with self.lock:
+                return self.conn.execute("SELECT COUNT(*) FROM sessions WHERE last_seen >= ?", (time.time() - self.ttl_seconds,)).fetchone()[0]
+        return len(self.sessions)
+
+store = SessionStore()
 
 def get_session_history(session_id: str) -> BaseChatMessageHistory:
-    if session_id not in store:
-        store[session_id] = ConversationBufferMemory(memory_key="chat_history", return_messages=True).chat_memory
-    return store[session_id]
\ No newline at end of file
+    return store.get(session_id)
+
+def approx_tokens(message):
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    return len(content) // 4 + 4
+
+def windowed_messages(messages, max_tokens=HISTORY_MAX_TOKENS):
+    """Most recent messages that fit in `max_tokens`, starting on a human turn so the prompt stays well-formed."""
+    window, used = [], 0
+    for message in reversed(messages):
+        used += approx_tokens(message)
+        if used > max_tokens: break
+        window.append(message)
+    window.reverse()
+    while window and not isinstance(window[0], HumanMessage):
+        window.pop(0)
+    return window
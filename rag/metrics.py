@@ -0,0 +1,173 @@
+# rag/metrics.py
+import os, sys, time, bisect, threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from langchain_core.callbacks import BaseCallbackHandler
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import METRICS_ENABLED
+
+# Minimal Prometheus text-format metrics, kept in-process: an observation is a perf_counter
+# difference, a bisect and a few additions under a lock. With several API workers every worker
+# exports its own series, as with prometheus_client's default registry.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _escape(value):
+    # Backslash, double quote and newline are the characters the text format requires escaping in label values
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values):
+    if not names: return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.label_names = name, help_text, labels
+        self.values, self.lock = {}, threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            lines += [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in sorted(self.values.items())]
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names, self.buckets = name, help_text, labels, buckets
+        self.series, self.lock = {}, threading.Lock() # labels -> [bucket counts..., overflow, sum, count]
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None: series = self.series[labels] = [0] * (len(self.buckets) + 3)
+            series[i] += 1 # Per-bucket counts, made cumulative when rendered
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((k, list(v)) for k, v in self.series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+class Gauge:
+    """Read when /metrics is scraped: `collect` returns {label values: value}."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), collect=None):
+        self.name, self.help, self.label_names, self.collect = name, help_text, labels, collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            values = self.collect() if self.collect else {}
+        except Exception:
+            values = {} # A failing source must not break the scrape
+        return lines + [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in sorted(values.items())]
+
+class CollectedCounter(Gauge):
+    """Like Gauge, for values that only ever grow (e.g. a cache's hit count), so rate() handles restarts."""
+    kind = "counter"
+
+STAGE_SECONDS = Histogram("rag_stage_duration_seconds", "Time spent in each stage of answering a question.", ("stage",))
+REQUEST_SECONDS = Histogram("rag_request_duration_seconds", "End-to-end API request latency.", ("endpoint",))
+REQUESTS = Counter("rag_requests_total", "API requests by endpoint and status code.", ("endpoint", "status"))
+FIRST_TOKEN_SECONDS = Histogram("rag_llm_time_to_first_token_seconds", "Time from LLM call to first streamed token.", ("role",))
+LLM_TOKENS = Counter("rag_llm_tokens_total", "LLM tokens reported by the provider.", ("role", "type"))
+_metrics = [STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, FIRST_TOKEN_SECONDS, LLM_TOKENS]
+_cache_sources = {} # cache name -> object with hits/misses (and optionally skipped/merged) counters
+
+def register_gauge(gauge):
+    _metrics[:] = [m for m in _metrics if m.name != gauge.name] + [gauge]
+
+def register_cache(name, cache):
+    """Exports a cache's hits/misses counters; registering the same name again (e.g. after an index reload) replaces it."""
+    _cache_sources[name] = cache
+
+def _cache_counts():
+    values = {}
+    for name, cache in _cache_sources.items():
+        for result in ("hits", "misses", "skipped", "merged"):
+            if hasattr(cache, result): values[(name, result)] = getattr(cache, result)
+    return values
+
+_metrics.append(CollectedCounter("rag_cache_requests_total", "Cache lookups by outcome since the cache was created.", ("cache", "result"), _cache_counts))
+
+def render_metrics():
+    return "\n".join(line for metric in _metrics for line in metric.render()) + "\n"
+
+# --- Per-request traces ---
+_trace = ContextVar("rag_trace", default=None)
+
+def start_trace(trace_id):
+    """Collects stage timings of the current request; tasks and executor threads started from it share the dict."""
+    trace = {"id": trace_id, "stages": {}}
+    _trace.set(trace)
+    return trace
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, name)
+    trace = _trace.get()
+    if trace is not None: trace["stages"][name] = trace["stages"].get(name, 0.0) + seconds
+
+@contextmanager
+def stage(name):
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+def server_timing(trace):
+    return ", ".join(f"{name};dur={1000 * seconds:.1f}" for name, seconds in trace["stages"].items())
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Times LLM calls and counts their tokens; `role` tells the answer model apart from the question rewriter."""
+    run_inline = True # Called on the event loop directly instead of through an executor
+
+    def __init__(self, role):
+        self.role, self.runs = role, {} # run_id -> [start, first token seen]
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.runs[run_id] = [time.perf_counter(), False]
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.runs[run_id] = [time.perf_counter(), False]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self.runs.get(run_id)
+        if run and not run[1]:
+            run[1] = True
+            FIRST_TOKEN_SECONDS.observe(time.perf_counter() - run[0], self.role)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self.runs.pop(run_id, None)
+        if run: observe_stage("llm_" + self.role, time.perf_counter() - run[0])
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                for kind in ("input_tokens", "output_tokens"):
+                    if usage.get(kind): LLM_TOKENS.inc(self.role, kind.split("_")[0], amount=usage[kind])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.runs.pop(run_id, None)
+
+def instrument_llm(llm, role):
+    return llm.with_config(callbacks=[LLMMetricsHandler(role)]) if METRICS_ENABLED else llm
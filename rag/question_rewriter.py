@@ -0,0 +1,76 @@
+# rag/question_rewriter.py
+import os, sys, re, hashlib, threading
+from collections import OrderedDict
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableBranch, RunnableLambda
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import REWRITE_CACHE_SIZE, REWRITE_HISTORY_MESSAGES, REWRITE_HEURISTIC
+from rag.metrics import stage
+
+# Words that usually point back at earlier turns ("what about its fees?", "and for them?")
+FOLLOW_UP_WORDS = {"it", "its", "this", "that", "these", "those", "they", "them", "their", "he", "she", "him", "her", "his", "hers",
+                   "there", "then", "same", "above", "previous", "former", "latter", "also", "else", "more", "another", "other", "one", "ones"}
+FOLLOW_UP_OPENERS = ("and ", "but ", "what about", "how about", "why ", "so ", "or ", "also ")
+
+def needs_rewrite(question):
+    q = question.strip().lower()
+    if not q.isascii(): return True # The heuristic only knows English; stay safe for other languages
+    words = re.findall(r"[a-z']+", q)
+    if len(words) < 4 or q.startswith(FOLLOW_UP_OPENERS): return True
+    return any(w in FOLLOW_UP_WORDS for w in words)
+
+class QuestionRewriter:
+    """Standalone-question rewriting with an LRU cache keyed by the recent history plus the question."""
+
+    def __init__(self, llm, prompt, cache_size=REWRITE_CACHE_SIZE, history_messages=REWRITE_HISTORY_MESSAGES, heuristic=REWRITE_HEURISTIC):
+        self.chain = prompt | llm | StrOutputParser()
+        self.cache_size, self.history_messages, self.heuristic = cache_size, history_messages, heuristic
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.skipped = 0
+
+    def _key(self, inputs):
+        recent = inputs["chat_history"][-self.history_messages:]
+        raw = "\x1e".join(f"{m.type}\x1f{m.content}" for m in recent) + "\x1d" + inputs["input"].strip()
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _lookup(self, inputs):
+        if self.heuristic and not needs_rewrite(inputs["input"]):
+            self.skipped += 1
+            return None, inputs["input"]
+        key = self._key(inputs)
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return key, self.cache[key]
+        self.misses += 1
+        return key, None
+
+    def _remember(self, key, question):
+        with self.lock:
+            self.cache[key] = question
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return question
+
+    def rewrite(self, inputs, config=None):
+        with stage("rewrite"):
+            key, question = self._lookup(inputs)
+            return question if question is not None else self._remember(key, self.chain.invoke(inputs, config=config))
+
+    async def arewrite(self, inputs, config=None):
+        with stage("rewrite"):
+            key, question = self._lookup(inputs)
+            return question if question is not None else self._remember(key, await self.chain.ainvoke(inputs, config=config))
+
+def create_cached_history_aware_retriever(llm, retriever, prompt):
+    """Drop-in for create_history_aware_retriever that only calls the LLM for uncached follow-up questions."""
+    rewriter = QuestionRewriter(llm, prompt)
+    retrieve_documents = RunnableBranch(
+        # No history: nothing to resolve, search with the question as asked
+        (lambda x: not x.get("chat_history"), (lambda x: x["input"]) | retriever),
+        RunnableLambda(rewriter.rewrite, afunc=rewriter.arewrite).with_config(run_name="rewrite_question") | retriever,
+    ).with_config(run_name="chat_retriever_chain")
+    return retrieve_documents, rewriter
@@ -1,46 +1,137 @@
 # rag/rag_chain.py
-import os, sys
+import os, sys, time, asyncio
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
+from langchain.chains import create_retrieval_chain
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from config import FAISS_INDEX_PATH, EMBEDDING_MODEL_NAME, LLM_NAME, TEMPERATURE, K
-from rag.memory_buffer import get_session_history
+from config import FAISS_INDEX_PATH, LLM_NAME, LLM_PROVIDER, TEMPERATURE, K, HYBRID_SEARCH, EMBED_BATCHING, EMBEDDING_SERVER, ANSWER_CACHE_ENABLED
+from embeddings.faiss_index import tune_index, read_index_mmap, read_index_meta
+from embeddings.model_backend import EncoderEmbeddings
+from embeddings.doc_store import docstore_exists, load_docstore
+from embeddings.index_snapshots import current_snapshot
+from rag.batch_embedder import BatchingEmbeddings, RecentQueryEmbeddings
+from rag.embedding_server import RemoteEmbeddings
+from rag.fake_llm import FakeChatModel
+from rag.lexical_index import LexicalIndex, HybridRetriever
+from rag.memory_buffer import get_session_history, windowed_messages
+from rag.question_rewriter import create_cached_history_aware_retriever
+from rag.metrics import stage, instrument_llm, register_cache
 
-def load_vectorstore():
-    if not os.path.exists(FAISS_INDEX_PATH):
+def load_embeddings_model(warm_up=False, remote=EMBEDDING_SERVER):
+    if remote: embeddings_model = RemoteEmbeddings() # The model lives in the host's shared embedding server
+    else:
+        embeddings_model = EncoderEmbeddings()
+        if EMBED_BATCHING: embeddings_model = BatchingEmbeddings(embeddings_model)
+    if ANSWER_CACHE_ENABLED: embeddings_model = RecentQueryEmbeddings(embeddings_model)
+    # The first forward pass allocates and JIT-initializes kernels; pay for it before taking traffic
+    if warm_up: embeddings_model.embed_query("warm-up query")
+    return embeddings_model
+
+def load_vectorstore(embeddings_model=None):
+    version, folder = current_snapshot()
+    if folder is None:
         raise FileNotFoundError(f"FAISS index not found at {FAISS_INDEX_PATH}.")
-    embeddings_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-    return FAISS.load_local(FAISS_INDEX_PATH, embeddings_model, allow_dangerous_deserialization=True)
+    if not docstore_exists(folder):
+        raise FileNotFoundError(f"No columnar docstore in {folder}; re-run embeddings/load_to_faiss.py to convert the index.")
+    index = read_index_mmap(os.path.join(folder, "index.faiss"), read_index_meta(folder)["type"])
+    docstore, index_to_docstore_id = load_docstore(folder)
+    vectorstore = FAISS(embeddings_model or load_embeddings_model(), index, docstore, index_to_docstore_id)
+    tune_index(vectorstore.index)
+    vectorstore.lexical_index = LexicalIndex.load(folder)
+    vectorstore.index_version, vectorstore.index_folder = version, folder
+    return vectorstore
+
+def load_llm():
+    if LLM_PROVIDER == "fake": return FakeChatModel()
+    return ChatGoogleGenerativeAI(model=LLM_NAME, temperature=TEMPERATURE)
 
-def create_rag_chain(vectorstore):
-    llm = ChatGoogleGenerativeAI(model=LLM_NAME, temperature=TEMPERATURE)
-    retriever = vectorstore.as_retriever(search_kwargs={'k': K})
+def create_rag_chain(vectorstore, llm=None):
+    llm = llm or load_llm()
+    # Without a BM25 index the retriever is dense-only; it still times embedding and search separately
+    retriever = HybridRetriever(vectorstore=vectorstore, lexical_index=getattr(vectorstore, "lexical_index", None) if HYBRID_SEARCH else None, k=K)
     contextualize_q_prompt = ChatPromptTemplate.from_messages([
         ("system", "Given a chat history and the latest user question which might reference context in the chat history, formulate a standalone question which can be understood without the chat history. Do NOT answer the question, just reformulate it if needed and otherwise return it as is."),
         MessagesPlaceholder("chat_history"),
         ("human", "{input}"),
     ])
-    history_aware_retriever = create_history_aware_retriever(llm, retriever, contextualize_q_prompt)
+    history_aware_retriever, rewriter = create_cached_history_aware_retriever(instrument_llm(llm, "rewrite"), retriever, contextualize_q_prompt)
+    register_cache("rewrite", rewriter)
     qa_prompt = ChatPromptTemplate.from_messages([
         ("system", "You are an college assistant bot for Francis Xavier Engineering College. Use only the pieces of retrieved context to answer the question. If you don't know the answer, just say that you don't know politely and ask the user to contact their mentor. Use three sentences maximum and keep the answer concise.\n\n{context}"),
         MessagesPlaceholder("chat_history"),
         ("human", "{input}"),
     ])
-    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+    def assemble_prompt(inputs):
+        # Same formatting as create_stuff_documents_chain, timed as its own stage
+        with stage("prompt"):
+            return qa_prompt.invoke({**inputs, "context": "\n\n".join(doc.page_content for doc in inputs["context"])})
+    question_answer_chain = (RunnableLambda(assemble_prompt).with_config(run_name="format_inputs") | instrument_llm(llm, "answer") | StrOutputParser()).with_config(run_name="stuff_documents_chain")
     return create_retrieval_chain(history_aware_retriever, question_answer_chain)
 
 def get_answer(question, session_id, rag_chain):
     chat_history = get_session_history(session_id)
-    response = rag_chain.invoke({"input": question, "chat_history": chat_history.messages})
+    response = rag_chain.invoke({"input": question, "chat_history": windowed_messages(chat_history.messages)})
     chat_history.add_user_message(question)
     chat_history.add_ai_message(response["answer"])
     return response
 
+async def aget_answer(question, session_id, rag_chain, answer_cache=None, index_version=None):
+    """With an AnswerCache, standalone questions are served from it or merged with an identical question in flight."""
+    chat_history = get_session_history(session_id)
+    inputs = {"input": question, "chat_history": windowed_messages(chat_history.messages)}
+    if answer_cache is not None and answer_cache.cacheable(question, inputs["chat_history"]):
+        response = await answer_cache.aget(question, index_version, lambda: rag_chain.ainvoke(inputs))
+    else:
+        response = await rag_chain.ainvoke(inputs)
+    chat_history.add_user_message(question)
+    chat_history.add_ai_message(response["answer"])
+    return response
+
+async def astream_answer(question, session_id, rag_chain, answer_cache=None, index_version=None):
+    """Yields ("sources", documents) as soon as retrieval finishes, then ("token", text) for each piece of the answer.
+
+    A cached or merged answer arrives as a single token.
+    """
+    chat_history = get_session_history(session_id)
+    inputs = {"input": question, "chat_history": windowed_messages(chat_history.messages)}
+    future = None
+    if answer_cache is not None and answer_cache.cacheable(question, inputs["chat_history"]):
+        vector, response = await answer_cache.lookup(question, index_version)
+        if response is None:
+            future, is_leader = answer_cache.lead(question, index_version)
+            if not is_leader:
+                try:
+                    response = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    if not future.cancelled(): raise # Otherwise the leader's client went away: answer here instead
+                future = None
+        if response is not None:
+            yield "sources", response["context"]
+            yield "token", response["answer"]
+            chat_history.add_user_message(question)
+            chat_history.add_ai_message(response["answer"])
+            return
+    start, answer_parts, context = time.perf_counter(), [], []
+    try:
+        async for chunk in rag_chain.astream(inputs):
+            if "context" in chunk:
+                context = chunk["context"]
+                yield "sources", context
+            if chunk.get("answer"):
+                answer_parts.append(chunk["answer"])
+                yield "token", chunk["answer"]
+    except BaseException as e:
+        if future is not None: answer_cache.finish(future, vector, question, index_version, error=e)
+        raise
+    if future is not None:
+        answer_cache.finish(future, vector, question, index_version, {"answer": "".join(answer_parts), "context": context}, time.perf_counter() - start)
+    chat_history.add_user_message(question)
+    chat_history.add_ai_message("".join(answer_parts))
+
 if __name__ == '__main__':
     vectorstore = load_vectorstore()
     rag_chain = create_rag_chain(vectorstore)
@@ -0,0 +1,77 @@
+# tests/test_answer_cache.py
+import os, sys, time, asyncio, zlib
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from rag.answer_cache import AnswerCache
+
+class StubEmbeddings:
+    """Identical questions get identical vectors and different questions orthogonal ones."""
+    async def aembed_query(self, text):
+        vector = [0.0] * 64
+        vector[zlib.crc32(text.encode("utf-8")) % 64] = 1.0
+        return vector
+
+def make_compute(calls, delay=0.05, answer="42", error=None):
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error: raise error
+        return {"answer": answer, "context": []}
+    return compute
+
+def test_concurrent_identical_questions_compute_once():
+    async def run():
+        cache, calls = AnswerCache(StubEmbeddings(), "v1"), []
+        responses = await asyncio.gather(*(cache.aget("What are the hostel fees?", "v1", make_compute(calls)) for _ in range(5)))
+        assert len(calls) == 1 and cache.misses == 1 and cache.merged == 4
+        assert all(r["answer"] == "42" for r in responses)
+        await cache.aget("What are the hostel fees?", "v1", make_compute(calls))
+        assert len(calls) == 1 and cache.hits == 1
+    asyncio.run(run())
+
+def test_followers_recompute_when_the_leader_is_cancelled():
+    async def run():
+        cache, calls = AnswerCache(StubEmbeddings(), "v1"), []
+        leader = asyncio.ensure_future(cache.aget("q", "v1", make_compute(calls, delay=1)))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(cache.aget("q", "v1", make_compute(calls, delay=0.01, answer="own")))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert (await follower)["answer"] == "own"
+        assert len(calls) == 2 and cache.merged == 1
+        with pytest.raises(asyncio.CancelledError): await leader
+    asyncio.run(run())
+
+def test_leader_error_reaches_followers():
+    async def run():
+        cache, calls = AnswerCache(StubEmbeddings(), "v1"), []
+        results = await asyncio.gather(*(cache.aget("q", "v1", make_compute(calls, error=RuntimeError("llm down"))) for _ in range(3)), return_exceptions=True)
+        assert len(calls) == 1
+        assert all(isinstance(r, RuntimeError) and str(r) == "llm down" for r in results)
+        assert len(cache) == 0 and not cache.inflight
+    asyncio.run(run())
+
+def test_nothing_hits_after_reset():
+    async def run():
+        cache, calls = AnswerCache(StubEmbeddings(), "v1"), []
+        await cache.aget("q", "v1", make_compute(calls))
+        cache.reset("v2")
+        await cache.aget("q", "v2", make_compute(calls))
+        assert len(calls) == 2 and cache.hits == 0
+        # A request still running on the old index neither hits nor disturbs the new version's entries
+        await cache.aget("other question", "v1", make_compute(calls))
+        assert cache.version == "v2" and len(cache) == 1
+        await cache.aget("q", "v2", make_compute(calls))
+        assert cache.hits == 1
+    asyncio.run(run())
+
+def test_expired_entries_are_dropped():
+    async def run():
+        cache, calls = AnswerCache(StubEmbeddings(), "v1", ttl_seconds=60), []
+        await cache.aget("old question", "v1", make_compute(calls, delay=0))
+        await cache.aget("new question", "v1", make_compute(calls, delay=0))
+        cache.entries[0]["created"] -= 120
+        await cache.aget("new question", "v1", make_compute(calls))
+        assert cache.hits == 1 and [e["question"] for e in cache.entries] == ["new question"]
+    asyncio.run(run())
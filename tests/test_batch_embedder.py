@@ -0,0 +1,49 @@
+# tests/test_batch_embedder.py
+import os, sys, time, asyncio, threading
+from langchain_core.embeddings import Embeddings
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from rag.batch_embedder import BatchingEmbeddings
+
+class SlowEmbeddings(Embeddings):
+    def __init__(self, delay=0.05, fail=False):
+        self.delay, self.fail, self.started = delay, fail, threading.Event()
+
+    def embed_documents(self, texts):
+        self.started.set()
+        time.sleep(self.delay)
+        if self.fail: raise RuntimeError("encoder failed")
+        return [[float(len(t))] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def test_cancelled_query_does_not_stop_the_worker():
+    base = SlowEmbeddings()
+    embedder = BatchingEmbeddings(base, window_ms=1)
+
+    async def cancel_mid_batch():
+        task = asyncio.ensure_future(embedder.aembed_query("dropped"))
+        await asyncio.get_running_loop().run_in_executor(None, base.started.wait)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(cancel_mid_batch())
+    assert embedder.submit("next").result(timeout=5) == [4.0]
+
+def test_cancelled_before_encoding_is_skipped():
+    base = SlowEmbeddings()
+    embedder = BatchingEmbeddings(base, window_ms=200)
+    dropped = embedder.submit("dropped")
+    assert dropped.cancel()
+    assert embedder.submit("kept").result(timeout=5) == [4.0]
+    assert embedder.queries == 1
+
+def test_encoder_error_reaches_every_query():
+    embedder = BatchingEmbeddings(SlowEmbeddings(fail=True), window_ms=1)
+    for _ in range(2):
+        try:
+            embedder.submit("q").result(timeout=5)
+            assert False, "expected the encoder error"
+        except RuntimeError as e:
+            assert "encoder failed" in str(e)
@@ -0,0 +1,102 @@
+# tests/test_dedup_chunks.py
+import os, sys, json, random
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ingestion.manifest as manifest_module
+import processing.dedup_chunks as dedup
+from processing.dedup_chunks import minhash_signatures, near_duplicate_roots, save_signatures, remove_signatures, refresh_near_duplicates
+
+_rng = random.Random(7)
+VOCAB = [f"word{i}" for i in range(5000)]
+
+def passage(n=200):
+    return " ".join(_rng.choice(VOCAB) for _ in range(n))
+
+def edited(text, word="reissued"):
+    words = text.split()
+    words[len(words) // 2] = word
+    return " ".join(words)
+
+def chunks(*texts):
+    return [{"content": t, "metadata": {"chunk_id": i + 1}} for i, t in enumerate(texts)]
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    monkeypatch.setattr(dedup, "NEAR_DUPLICATES_FOLDER", str(tmp_path / "near_duplicates"))
+    monkeypatch.setattr(dedup, "MAP_PATH", str(tmp_path / "near_duplicates" / "duplicates.json"))
+    monkeypatch.setattr(dedup, "CHUNKS_FOLDER", str(tmp_path / "chunks"))
+    monkeypatch.setattr(manifest_module, "MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    (tmp_path / "chunks").mkdir()
+    return tmp_path
+
+def test_signatures_estimate_similarity():
+    text = passage()
+    signatures = minhash_signatures([text, text, edited(text), passage(), ""])
+    assert (signatures[0] == signatures[1]).all()
+    assert (signatures[0] == signatures[2]).mean() >= 0.8
+    assert (signatures[0] == signatures[3]).mean() < 0.2
+    assert (signatures[4] == np.uint32(0xFFFFFFFF)).all()
+
+def test_short_identical_chunks_match():
+    signatures = minhash_signatures(["Office of the Registrar", "office of the   registrar", "Office of the Controller"])
+    assert near_duplicate_roots(signatures).tolist() == [0, 0, 2]
+
+def test_roots_group_near_duplicates_under_the_lowest_row():
+    a, b = passage(), passage()
+    roots = near_duplicate_roots(minhash_signatures([b, a, edited(a, "x"), passage(), edited(a, "y"), "", ""]))
+    # Empty chunks are never merged with each other
+    assert roots.tolist() == [0, 1, 1, 3, 1, 5, 6]
+
+def test_groups_span_files_and_list_their_sources(folders):
+    circular, notes = passage(), passage()
+    manifest = {f: {"hash": f} for f in ("a.pdf", "b.pdf", "c.pdf")}
+    save_signatures("a.pdf", chunks(circular, notes))
+    save_signatures("b.pdf", chunks(passage(), edited(circular)))
+    save_signatures("c.pdf", chunks(edited(circular, "amended"), edited(notes)))
+    assert refresh_near_duplicates(manifest) == {"b.pdf", "c.pdf"}
+    near = dedup.load_near_duplicates()
+    assert near["duplicates"] == {"b.pdf": {"2": "a.pdf#1"}, "c.pdf": {"1": "a.pdf#1", "2": "a.pdf#2"}}
+    assert near["sources"] == {"a.pdf#1": ["a.pdf", "b.pdf", "c.pdf"], "a.pdf#2": ["a.pdf", "c.pdf"]}
+    assert refresh_near_duplicates(manifest) == set()
+
+def test_canonical_moves_to_a_survivor_when_its_file_is_deleted(folders):
+    circular = passage()
+    manifest = {f: {"hash": f} for f in ("a.pdf", "b.pdf", "c.pdf")}
+    for fname in manifest: save_signatures(fname, chunks(circular, passage()))
+    refresh_near_duplicates(manifest)
+    manifest["a.pdf"]["hash"] = None
+    remove_signatures("a.pdf")
+    changed = refresh_near_duplicates(manifest)
+    near = dedup.load_near_duplicates()
+    # b.pdf now holds the canonical chunk, so it has to be embedded in full again
+    assert changed == {"b.pdf", "c.pdf"}
+    assert near["duplicates"] == {"c.pdf": {"1": "b.pdf#1"}}
+    assert near["sources"] == {"b.pdf#1": ["b.pdf", "c.pdf"]}
+
+def write_chunked(folders, manifest, fname, texts):
+    manifest[fname] = {"hash": fname, "extracted": fname, "chunked": fname}
+    with open(os.path.join(folders, "chunks", fname + "_chunks.json"), "w", encoding="utf-8") as f:
+        json.dump(chunks(*texts), f)
+
+def test_disabled_stage_still_passes_files_on(folders, monkeypatch):
+    circular = passage()
+    manifest = {}
+    for fname in ("a.pdf", "b.pdf"): write_chunked(folders, manifest, fname, [circular, passage()])
+    manifest_module.save_manifest(manifest)
+    dedup.main()
+    manifest = manifest_module.load_manifest()
+    assert manifest_module.stale_files(manifest, "embedded") == ["a.pdf", "b.pdf"]
+    for fname in manifest:
+        for stage in ("embedded", "indexed"): manifest_module.mark_done(manifest, fname, stage)
+    write_chunked(folders, manifest, "c.pdf", [passage()])
+    manifest_module.save_manifest(manifest)
+
+    monkeypatch.setattr(dedup, "DEDUP_ENABLED", False)
+    dedup.main()
+    manifest = manifest_module.load_manifest()
+    assert not os.path.exists(dedup.MAP_PATH)
+    # The new file reaches embedding, and b.pdf is embedded again with the chunk it used to skip
+    assert manifest_module.stale_files(manifest, "embedded") == ["b.pdf", "c.pdf"]
+    assert manifest_module.stale_files(manifest, "deduped") == []
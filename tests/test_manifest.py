@@ -0,0 +1,77 @@
+# tests/test_manifest.py
+import os, sys
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ingestion.manifest as manifest_module
+from ingestion.manifest import STAGES, load_manifest, save_manifest, sync_sources, stale_files, mark_done, invalidate
+
+@pytest.fixture
+def data_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifest_module, "MANIFEST_PATH", str(tmp_path / "state" / "manifest.json"))
+    folder = tmp_path / "data"
+    folder.mkdir()
+    return folder
+
+def run_all_stages(manifest):
+    for stage in STAGES:
+        for fname in stale_files(manifest, stage): mark_done(manifest, fname, stage)
+
+def test_new_file_goes_through_every_stage(data_folder):
+    (data_folder / "a.txt").write_text("alpha")
+    manifest = sync_sources(load_manifest(), str(data_folder))
+    assert manifest["a.txt"]["hash"]
+    assert stale_files(manifest, "extracted") == ["a.txt"]
+    assert not any(stale_files(manifest, stage) for stage in STAGES[1:])
+    for stage in STAGES:
+        assert stale_files(manifest, stage) == ["a.txt"]
+        mark_done(manifest, "a.txt", stage)
+    assert manifest["a.txt"]["indexed"] == manifest["a.txt"]["hash"]
+
+def test_modified_file_makes_every_stage_stale(data_folder):
+    (data_folder / "a.txt").write_text("alpha")
+    (data_folder / "b.txt").write_text("beta")
+    manifest = sync_sources({}, str(data_folder))
+    run_all_stages(manifest)
+    assert not any(stale_files(manifest, stage) for stage in STAGES)
+    (data_folder / "a.txt").write_text("alpha, edited")
+    sync_sources(manifest, str(data_folder))
+    assert stale_files(manifest, "extracted") == ["a.txt"]
+    # Each stage becomes stale once the stage before it has processed the new content
+    for stage in STAGES:
+        assert stale_files(manifest, stage) == ["a.txt"]
+        mark_done(manifest, "a.txt", stage)
+
+def test_deleted_file_is_dropped_after_every_stage(data_folder):
+    (data_folder / "a.txt").write_text("alpha")
+    manifest = sync_sources({}, str(data_folder))
+    run_all_stages(manifest)
+    os.remove(data_folder / "a.txt")
+    sync_sources(manifest, str(data_folder))
+    assert manifest["a.txt"]["hash"] is None
+    for stage in STAGES:
+        assert stale_files(manifest, stage) == ["a.txt"]
+        mark_done(manifest, "a.txt", stage)
+        assert ("a.txt" in manifest) == (stage != STAGES[-1])
+
+def test_unchanged_size_and_mtime_skip_rehash(data_folder, monkeypatch):
+    (data_folder / "a.txt").write_text("alpha")
+    manifest = sync_sources({}, str(data_folder))
+    save_manifest(manifest)
+    hashed = []
+    monkeypatch.setattr(manifest_module, "file_hash", lambda path: hashed.append(path) or "rehashed")
+    manifest = sync_sources(load_manifest(), str(data_folder))
+    assert hashed == [] and manifest["a.txt"]["hash"] != "rehashed"
+    stat = os.stat(data_folder / "a.txt")
+    os.utime(data_folder / "a.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert sync_sources(manifest, str(data_folder))["a.txt"]["hash"] == "rehashed"
+
+def test_invalidate_keeps_earlier_stages(data_folder):
+    (data_folder / "a.txt").write_text("alpha")
+    manifest = sync_sources({}, str(data_folder))
+    run_all_stages(manifest)
+    invalidate(manifest, "chunked")
+    assert stale_files(manifest, "extracted") == []
+    assert manifest["a.txt"]["extracted"] == manifest["a.txt"]["hash"]
+    assert all(manifest["a.txt"][stage] is None for stage in STAGES[STAGES.index("chunked"):])
+    assert stale_files(manifest, "chunked") == ["a.txt"]
@@ -0,0 +1,56 @@
+# tests/test_ollama_client.py
+import os, sys, time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from fake_ollama import start_fake_ollama
+from ollama_client import OllamaClient, OllamaError
+from main import generate_questions
+
+@pytest.fixture
+def fake_server():
+    servers = []
+    def start(**kwargs):
+        servers.append(start_fake_ollama(port=0, **kwargs))
+        return servers[-1]
+    yield start
+    for server in servers: server.shutdown()
+
+def test_failed_attempt_is_retried(fake_server):
+    server = fake_server(latency_ms=10, token_ms=0, fail_first=1)
+    client = OllamaClient(server.url, timeout=5, retries=1)
+    text = generate_questions("Section A", "UNIT I Mechanics", 2, 2, client=client)
+    assert server.requests == 2
+    assert text.count("(2 marks)") == 2
+
+def test_retries_are_bounded(fake_server):
+    server = fake_server(latency_ms=10, token_ms=0, fail_first=5)
+    with pytest.raises(OllamaError, match="after 2 attempt"):
+        OllamaClient(server.url, timeout=5, retries=1).generate("Create 1 questions of 2 marks")
+    assert server.requests == 2
+
+def test_slow_first_token_times_out(fake_server):
+    server = fake_server(latency_ms=2000, token_ms=0)
+    start = time.perf_counter()
+    with pytest.raises(OllamaError):
+        OllamaClient(server.url, timeout=0.3, retries=0).generate("Create 1 questions of 2 marks")
+    assert time.perf_counter() - start < 1.5
+
+def test_section_deadline_bounds_a_slow_stream(fake_server):
+    # Every token arrives within the read timeout, but the whole answer takes longer than the section may
+    server = fake_server(latency_ms=0, token_ms=50)
+    with pytest.raises(OllamaError, match="No complete answer"):
+        OllamaClient(server.url, timeout=0.3, retries=0).generate("Create 5 questions of 13 marks")
+
+def test_sections_run_concurrently(fake_server):
+    server = fake_server(latency_ms=400, token_ms=0)
+    client = OllamaClient(server.url, timeout=5, retries=0, pool_size=3)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        sections = [pool.submit(generate_questions, f"Section {s}", "UNIT I Mechanics", n, m, client=client)
+                    for s, n, m in (("A", 10, 2), ("B", 5, 13), ("C", 1, 15))]
+        texts = [s.result() for s in sections]
+    elapsed = time.perf_counter() - start
+    assert [t.count("marks)") for t in texts] == [10, 5, 1]
+    assert elapsed < 2 * 0.4 # One section's latency, not three